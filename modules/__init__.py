@@ -3,4 +3,6 @@ from modules.inputs.preprocess import *
 from modules.sim_calc import *
 from modules.rep_frames import *
 from modules.graph import *
-from modules.write_cpptraj import *
\ No newline at end of file
+from modules.write_cpptraj import *
+from modules.cluster_store import *
+from modules.cache import *
\ No newline at end of file
@@ -0,0 +1,164 @@
+"""Persistent on-disk cache for intermediate arrays, keyed by content hash and parameters."""
+import glob
+import hashlib
+import json
+import os
+import tempfile
+import numpy as np
+
+def content_hash(data, chunk_bytes=2**24):
+    """Returns a hash of the dtype, shape and values of an array.
+
+    Parameters
+    ----------
+    data : numpy.ndarray
+        The array to hash, read in blocks of rows so memory maps are not loaded at once.
+    chunk_bytes : int, optional
+        The approximate number of bytes hashed per block. The default is 2**24.
+
+    Returns
+    -------
+    str
+        The hexadecimal hash.
+    """
+    data = np.asarray(data)
+    hasher = hashlib.blake2b(digest_size=20)
+    hasher.update(f"{data.dtype.str}{data.shape}".encode())
+    if data.ndim == 0 or len(data) == 0:
+        hasher.update(np.ascontiguousarray(data).tobytes())
+        return hasher.hexdigest()
+    row_bytes = max(1, data[0].nbytes)
+    block = max(1, chunk_bytes // row_bytes)
+    for start in range(0, len(data), block):
+        hasher.update(np.ascontiguousarray(data[start:start + block]).tobytes())
+    return hasher.hexdigest()
+
+class StatsCache:
+    """A size-bounded, least-recently-used cache of arrays saved as `.npz` files.
+
+    Each entry is a dict of arrays stored under a key built from the content hash
+    of the inputs and the parameters they were calculated with, so entries stay
+    valid across runs and are shared by every run with the same inputs.
+
+    Attributes
+    ----------
+    cache_dir : str
+        The folder of the cache files.
+    max_bytes : int
+        The maximum total size of the cache files, the least recently used
+        entries are evicted above it.
+
+    Methods
+    -------
+    key(*parts)
+        Builds an entry key from content hashes and parameters.
+    get(key)
+        Returns the arrays of an entry, None if not cached.
+    put(key, arrays)
+        Saves the arrays of an entry and evicts old entries if needed.
+    clear()
+        Removes every entry.
+    """
+    def __init__(self, cache_dir, max_bytes=2**30):
+        """Initializes instances for the StatsCache class.
+
+        Parameters
+        ----------
+        cache_dir : str
+            The folder of the cache files, created if needed.
+        max_bytes : int, optional
+            The maximum total size of the cache files. The default is 1 GiB.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(*parts):
+        """Builds an entry key from content hashes and parameters.
+
+        Parameters
+        ----------
+        *parts : str, int, float or None
+            The content hashes and parameters identifying the entry,
+            e.g. `key(content_hash(ck), 'stats', n_ary, weight, w_factor)`.
+
+        Returns
+        -------
+        str
+            The hexadecimal key.
+        """
+        return hashlib.blake2b(json.dumps(parts).encode(), digest_size=20).hexdigest()
+
+    def _path(self, key):
+        """Returns the path of the file of an entry."""
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    def get(self, key):
+        """Returns the arrays of an entry and marks it as recently used.
+
+        Parameters
+        ----------
+        key : str
+            The entry key.
+
+        Returns
+        -------
+        dict
+            The arrays of the entry, None if the entry is not cached.
+        """
+        path = self._path(key)
+        try:
+            with np.load(path) as entry:
+                arrays = {name: entry[name] for name in entry.files}
+            os.utime(path)
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+        return arrays
+
+    def put(self, key, arrays):
+        """Saves the arrays of an entry, then evicts the least recently used
+        entries while the cache is larger than `max_bytes`.
+
+        Parameters
+        ----------
+        key : str
+            The entry key.
+        arrays : dict
+            The arrays to save, keyed by name.
+        """
+        # Write to a temporary file first so concurrent runs never read a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, **arrays)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._evict()
+
+    def _evict(self):
+        """Removes the least recently used entries until the cache fits in `max_bytes`."""
+        entries = []
+        for path in glob.glob(os.path.join(self.cache_dir, '*.npz')):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        """Removes every entry of the cache."""
+        for path in glob.glob(os.path.join(self.cache_dir, '*.npz')):
+            os.remove(path)
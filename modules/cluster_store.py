@@ -0,0 +1,220 @@
+"""Packed storage for the normalized cluster files, read with memory mapping."""
+import glob
+import hashlib
+import os
+import re
+import tempfile
+import numpy as np
+
+class ClusterStore:
+    """A class to store all clusters in a single packed array with an offsets index.
+
+    The frames of cluster k are ``data[offsets[k]:offsets[k + 1]]``. The store is
+    saved as two `.npy` files and opened with memory mapping, so slicing a cluster
+    is zero-copy and only the frames that are used are read from disk.
+
+    Attributes
+    ----------
+    data : numpy.ndarray
+        The frames of all clusters, stacked in cluster order.
+    offsets : numpy.ndarray
+        The start of each cluster in `data`, with the total number of frames appended.
+    folder : str
+        The folder the store was opened from, None for an in-memory store.
+
+    Methods
+    -------
+    open(folder)
+        Opens a saved store with memory mapping.
+    save(folder, clusters)
+        Packs a list of clusters (arrays or `.npy` files) into a store.
+    from_folder(folder)
+        Opens the store of a folder, packing its `normed_clusttraj.c*.npy` files if needed.
+    """
+    data_name = 'packed_clusttraj.npy'
+    offsets_name = 'packed_clusttraj.offsets.npy'
+
+    def __init__(self, data, offsets, folder=None):
+        """Initializes instances for the ClusterStore class.
+
+        Parameters
+        ----------
+        data : numpy.ndarray
+            The frames of all clusters, stacked in cluster order.
+        offsets : array_like
+            The start of each cluster in `data`, with the total number of frames appended.
+        folder : str, optional
+            The folder the store was opened from. The default is None.
+        """
+        self.data = data
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.folder = folder
+        if self.offsets[-1] != len(self.data):
+            raise ValueError("Offsets do not match the number of packed frames")
+
+    def __len__(self):
+        """Returns the number of clusters."""
+        return len(self.offsets) - 1
+
+    def __getitem__(self, k):
+        """Returns the frames of cluster `k` as a view of the packed data,
+        or a list of views if `k` is a slice."""
+        if isinstance(k, slice):
+            return [self[i] for i in range(len(self))[k]]
+        if not -len(self) <= k < len(self):
+            raise IndexError(f"Cluster {k} out of range for {len(self)} clusters")
+        k = k % len(self)
+        return self.data[self.offsets[k]:self.offsets[k + 1]]
+
+    def __iter__(self):
+        """Iterates over the clusters in order."""
+        for k in range(len(self)):
+            yield self[k]
+
+    @property
+    def n_frames(self):
+        """Returns the number of frames of each cluster."""
+        return np.diff(self.offsets)
+
+    @classmethod
+    def exists(cls, folder):
+        """Returns whether a packed store is saved in `folder`."""
+        return (os.path.exists(f"{folder}/{cls.data_name}")
+                and os.path.exists(f"{folder}/{cls.offsets_name}"))
+
+    @classmethod
+    def open(cls, folder, mmap_mode='r'):
+        """Opens a saved store.
+
+        Parameters
+        ----------
+        folder : str
+            The folder containing the packed store.
+        mmap_mode : {None, 'r', 'r+', 'c'}, optional
+            Memory mapping mode of the packed data. The default is 'r'.
+
+        Returns
+        -------
+        ClusterStore
+            The opened store.
+        """
+        data = np.load(f"{folder}/{cls.data_name}", mmap_mode=mmap_mode)
+        offsets = np.load(f"{folder}/{cls.offsets_name}")
+        return cls(data, offsets, folder=folder)
+
+    @classmethod
+    def save(cls, folder, clusters, dtype=None):
+        """Packs clusters into a store, writing one cluster at a time to a memory-mapped file.
+
+        Parameters
+        ----------
+        folder : str
+            The folder to save the packed store to.
+        clusters : list
+            The clusters in order, as numpy arrays or paths to `.npy` files.
+        dtype : numpy.dtype, optional
+            The dtype of the packed data. The default is the dtype of the first cluster.
+
+        Returns
+        -------
+        ClusterStore
+            The saved store, opened with memory mapping.
+        """
+        clusters = [np.load(c, mmap_mode='r') if isinstance(c, str) else c for c in clusters]
+        if not clusters:
+            raise ValueError("No clusters to pack")
+        n_features = clusters[0].shape[1]
+        if any(c.shape[1] != n_features for c in clusters):
+            raise ValueError("Clusters have different number of features")
+        offsets = np.concatenate([[0], np.cumsum([len(c) for c in clusters])])
+        dtype = dtype or clusters[0].dtype
+
+        os.makedirs(folder, exist_ok=True)
+        # Write to temporary files first so concurrent runs never map a partial store,
+        # the offsets are replaced last and `from_folder` repacks on a mismatch
+        data_path = cls._temp_path(folder, cls.data_name)
+        offsets_path = cls._temp_path(folder, cls.offsets_name)
+        try:
+            packed = np.lib.format.open_memmap(data_path, mode='w+', dtype=dtype,
+                                               shape=(int(offsets[-1]), n_features))
+            for k, cluster in enumerate(clusters):
+                packed[offsets[k]:offsets[k + 1]] = cluster
+            packed.flush()
+            del packed
+            with open(offsets_path, 'wb') as f:
+                np.save(f, offsets)
+            os.replace(data_path, f"{folder}/{cls.data_name}")
+            os.replace(offsets_path, f"{folder}/{cls.offsets_name}")
+        except BaseException:
+            for path in (data_path, offsets_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            raise
+        return cls.open(folder)
+
+    @staticmethod
+    def _temp_path(folder, name):
+        """Returns the path of a new empty temporary file for `name` in `folder`."""
+        fd, path = tempfile.mkstemp(dir=folder, prefix=f".{name}.", suffix='.tmp')
+        os.close(fd)
+        return path
+
+    def _matches(self, files):
+        """Returns whether the store holds the clusters of `files`, with one cluster 
+        per file of the same shape, and none of them changed after it was packed."""
+        if len(files) != len(self) or self.folder is None:
+            return False
+        packed_time = os.path.getmtime(f"{self.folder}/{self.data_name}")
+        for k, file in enumerate(files):
+            # The change time is also updated by copies that keep the modification time
+            stat = os.stat(file)
+            if max(stat.st_mtime, stat.st_ctime) > packed_time:
+                return False
+            shape = np.load(file, mmap_mode='r').shape
+            if shape != (self.n_frames[k], self.data.shape[1]):
+                return False
+        return True
+
+    @classmethod
+    def from_folder(cls, folder, base_name='normed_clusttraj'):
+        """Opens the store of a folder of normalized cluster files.
+
+        The `{base_name}.c*.npy` files are packed into a store the first time
+        and again whenever files were added, removed, resized or changed after 
+        the saved store. If `folder` is not writable, the store is saved to a 
+        folder of the temporary directory instead.
+
+        Parameters
+        ----------
+        folder : str
+            The folder containing the normalized cluster files.
+        base_name : str, optional
+            The base name of the cluster files. The default is 'normed_clusttraj'.
+
+        Returns
+        -------
+        ClusterStore
+            The opened store.
+        """
+        files = sorted(glob.glob(f"{folder}/{base_name}.c*.npy"),
+                       key=lambda x: int(re.findall(r"c(\d+)\.npy$", x)[0]))
+        if not files:
+            if cls.exists(folder):
+                return cls.open(folder)
+            raise FileNotFoundError(f"No {base_name}.c*.npy files or packed store in {folder}")
+        fallback = os.path.join(tempfile.gettempdir(), 'prime_cluster_store',
+                                hashlib.blake2b(os.path.abspath(folder).encode(), digest_size=10).hexdigest())
+        for store_folder in (folder, fallback):
+            if cls.exists(store_folder):
+                try:
+                    store = cls.open(store_folder)
+                except (ValueError, OSError):
+                    # A store being replaced by a concurrent run, packed again below
+                    store = None
+                if store is not None and store._matches(files):
+                    return store
+            try:
+                return cls.save(store_folder, files)
+            except PermissionError:
+                continue
+        raise PermissionError(f"Cannot save the packed store to {folder} or {fallback}")
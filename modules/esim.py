@@ -12,16 +12,26 @@
 """
 
 import numpy as np
-from math import log, ceil
+from math import ceil
 
-def calculate_counters(data, n_objects = None, c_threshold = None, w_factor = "fraction"):
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# Initials of the n-ary indices, every index has a weighted ('w') and non-weighted ('nw') form
+INDICES = ['AC', 'BUB', 'CT1', 'CT2', 'CT3', 'CT4', 'Fai', 'Gle', 'Ja',
+           'Ja0', 'JT', 'RT', 'RR', 'SM', 'SS1', 'SS2']
+
+def calculate_counters(data, n_objects = None, c_threshold = None, w_factor = "fraction", backend = "numpy"):
     """Calculate 1-similarity, 0-similarity, and dissimilarity counters
 
     Arguments
     ---------
-    data : np.ndarray
+    data : {np.ndarray, PackedFingerprints}
         Array of arrays, each sub-array contains the binary object 
         OR Array with the columnwise sum, if so specify n_objects
+        OR bit-packed binary objects, see `pack_fingerprints`
 
     n_objects: int
         Number of objects, only necessary if the column wize sum is the input data.
@@ -40,6 +50,11 @@ def calculate_counters(data, n_objects = None, c_threshold = None, w_factor = "f
                     dissimilarity = n**-(d[k] - n_objects % 2)
         other values : similarity = dissimilarity = 1
 
+    backend : {"numpy", "numba"}
+        'numpy' : Default, vectorized NumPy expressions.
+        'numba' : JIT-compiled single pass over the features, falls back to 
+                  'numpy' if numba is not installed.
+
     Returns
     -------
     counters : dict
@@ -47,6 +62,10 @@ def calculate_counters(data, n_objects = None, c_threshold = None, w_factor = "f
 
     """
     
+    if isinstance(data, PackedFingerprints):
+        n_objects = len(data)
+        data = data.c_total()
+
     # Check if the data is a np.ndarray of a list
     if not isinstance(data, np.ndarray):
         raise TypeError("Warning: Input data is not a np.ndarray, to secure the right results please input the right data type")
@@ -64,6 +83,10 @@ def calculate_counters(data, n_objects = None, c_threshold = None, w_factor = "f
         n_objects = len(data)
         print("Doing calculations with", n_objects, "objects.")
 
+    if backend == "numba" and numba is not None:
+        counters = calculate_counters_batch(c_total, n_objects, c_threshold, w_factor, backend)
+        return {key: value[0] for key, value in counters.items()}
+
     # Assign c_threshold
     if not c_threshold:
         c_threshold = n_objects % 2
@@ -135,9 +158,167 @@ def calculate_counters(data, n_objects = None, c_threshold = None, w_factor = "f
                 "p": p, "w_p": w_p}
     return counters
 
+def calculate_counters_batch(c_totals, n_objects, c_threshold = None, w_factor = "fraction", backend = "numpy"):
+    """Calculate 1-similarity, 0-similarity, and dissimilarity counters for
+    many columnwise sums at once.
+
+    Arguments
+    ---------
+    c_totals : np.ndarray
+        2D array with one columnwise sum per row, shape (n_comparisons, n_features).
+        A 1D array is treated as a single comparison.
+
+    n_objects : {int, np.ndarray}
+        Number of objects summed in each row. Either a scalar shared by all
+        rows or an array with one value per row.
+
+    c_threshold : {None, 'dissimilar', int}
+        Coincidence threshold, same options as `calculate_counters`.
+
+    w_factor : {"fraction", "power_n"}
+        Type of weight function that will be used, same options as `calculate_counters`.
+
+    backend : {"numpy", "numba"}
+        'numpy' : Default, vectorized NumPy expressions.
+        'numba' : JIT-compiled single pass without temporaries, falls back to 
+                  'numpy' if numba is not installed.
+
+    Returns
+    -------
+    counters : dict
+        Dictionary with the weighted and non-weighted counters,
+        each value is an np.ndarray with one entry per row of `c_totals`.
+    """
+    if not isinstance(c_totals, np.ndarray):
+        raise TypeError("Warning: Input data is not a np.ndarray, to secure the right results please input the right data type")
+    if n_objects is None:
+        raise ValueError("Input data are columnwise sums, please specify number of objects")
+
+    c_totals = np.atleast_2d(c_totals)
+    n_objects = np.broadcast_to(np.asarray(n_objects), (len(c_totals),)).reshape(-1, 1)
+
+    # Assign c_threshold
+    if not c_threshold or c_threshold == 'min':
+        c_threshold = n_objects % 2
+    elif c_threshold == 'dissimilar':
+        c_threshold = np.ceil(n_objects / 2)
+    elif isinstance(c_threshold, int):
+        if np.any(c_threshold >= n_objects):
+            raise ValueError("c_threshold cannot be equal or greater than n_objects.")
+    elif 0 < c_threshold < 1:
+        c_threshold = c_threshold * n_objects
+
+    if backend == "numba" and numba is not None:
+        if w_factor and "power" in w_factor:
+            w_code, power = 1, float(w_factor.split("_")[-1])
+        elif w_factor == "fraction":
+            w_code, power = 0, 0.
+        else:
+            w_code, power = 2, 0.
+        n_objects = n_objects.ravel().astype(np.float64)
+        c_threshold = np.broadcast_to(c_threshold, (len(c_totals), 1)).ravel().astype(np.float64)
+        counts, w_counts = _counters_numba(np.ascontiguousarray(c_totals, dtype = np.float64), 
+                                           n_objects, c_threshold, w_code, power)
+        a, d, total_dis = counts.T
+        w_a, w_d, total_w_dis = w_counts.T
+        total_sim = a + d
+        total_w_sim = w_a + w_d
+        counters = {"a": a, "w_a": w_a, "d": d, "w_d": w_d,
+                    "total_sim": total_sim, "total_w_sim": total_w_sim,
+                    "total_dis": total_dis, "total_w_dis": total_w_dis,
+                    "p": total_sim + total_dis, "w_p": total_w_sim + total_w_dis}
+        return counters
+
+    # Set w_factor
+    if w_factor and "power" in w_factor:
+        power = float(w_factor.split("_")[-1])
+        def f_s(d):
+            return np.power(power, -(n_objects - d))
+
+        def f_d(d):
+            return np.power(power, -(d - n_objects % 2))
+    elif w_factor == "fraction":
+        def f_s(d):
+            return d / n_objects
+
+        def f_d(d):
+            return 1 - (d - n_objects % 2) / n_objects
+    else:
+        def f_s(d):
+            return np.ones_like(d)
+
+        def f_d(d):
+            return np.ones_like(d)
+
+    # Calculate a, d, b + c
+    diff = 2 * c_totals - n_objects
+    abs_diff = np.abs(diff)
+    a_indices = diff > c_threshold
+    d_indices = -diff > c_threshold
+    dis_indices = abs_diff <= c_threshold
+
+    a = np.sum(a_indices, axis = 1)
+    d = np.sum(d_indices, axis = 1)
+    total_dis = np.sum(dis_indices, axis = 1)
+
+    s_weights = f_s(abs_diff)
+    w_a = np.sum(s_weights, axis = 1, where = a_indices)
+    w_d = np.sum(s_weights, axis = 1, where = d_indices)
+    total_w_dis = np.sum(f_d(abs_diff), axis = 1, where = dis_indices)
+
+    total_sim = a + d
+    total_w_sim = w_a + w_d
+    p = total_sim + total_dis
+    w_p = total_w_sim + total_w_dis
+
+    counters = {"a": a, "w_a": w_a, "d": d, "w_d": w_d,
+                "total_sim": total_sim, "total_w_sim": total_w_sim,
+                "total_dis": total_dis, "total_w_dis": total_w_dis,
+                "p": p, "w_p": w_p}
+    return counters
+
+if numba is not None:
+    @numba.njit(cache = True)
+    def _counters_numba(c_totals, n_objects, c_threshold, w_code, power):
+        """Fused counter accumulation, one pass over the features of each row.
+
+        w_code is 0 for 'fraction', 1 for 'power_n' and 2 for no weights.
+        Returns the (a, d, total_dis) counts and the (w_a, w_d, total_w_dis) weighted counts.
+        """
+        n_rows, n_features = c_totals.shape
+        counts = np.zeros((n_rows, 3), dtype = np.int64)
+        w_counts = np.zeros((n_rows, 3))
+        for r in range(n_rows):
+            n = n_objects[r]
+            threshold = c_threshold[r]
+            n_odd = n % 2
+            for f in range(n_features):
+                diff = 2 * c_totals[r, f] - n
+                abs_diff = abs(diff)
+                if diff > threshold or -diff > threshold:
+                    if w_code == 0:
+                        w = abs_diff / n
+                    elif w_code == 1:
+                        w = power ** -(n - abs_diff)
+                    else:
+                        w = 1.
+                    col = 0 if diff > threshold else 1
+                    counts[r, col] += 1
+                    w_counts[r, col] += w
+                elif abs_diff <= threshold:
+                    if w_code == 0:
+                        w = 1 - (abs_diff - n_odd) / n
+                    elif w_code == 1:
+                        w = power ** -(abs_diff - n_odd)
+                    else:
+                        w = 1.
+                    counts[r, 2] += 1
+                    w_counts[r, 2] += w
+        return counts, w_counts
+
 class SimilarityIndex:
     def __init__(self, data, n_objects = None, c_threshold = None, n_ary = 'RR', 
-                 w_factor = 'fraction', weight = 'nw', return_dict = False):
+                 w_factor = 'fraction', weight = 'nw', return_dict = False, backend = 'numpy'):
         # Indices
         # AC: Austin-Colwell, BUB: Baroni-Urbani-Buser, CTn: Consoni-Todschini n
         # Fai: Faith, Gle: Gleason, Ja: Jaccard, Ja0: Jaccard 0-variant
@@ -150,7 +331,8 @@ class SimilarityIndex:
         self.w_factor = w_factor
         self.c_threshold = c_threshold
         self.weight = weight
-        self.counters = calculate_counters(self.data, self.n_objects, self.c_threshold, self.w_factor)
+        self.backend = backend
+        self.counters = self._calculate_counters()
         self.return_dict = return_dict
         
         if self.return_dict == True:
@@ -172,23 +354,72 @@ class SimilarityIndex:
         Returns:
         --------
         If `return_dict` attribute is True, returns a dictionary of similarity scores.
-        If `return_dict` attribute is False, returns the similarity score obtained by
+        If `n_ary` attribute is a list of indices, returns a structured array with one 
+        field per index, all evaluated from the same counters (see `gen_sim_array`).
+        Otherwise, returns the similarity score obtained by
         applying the specified n-ary comparison method (`n_ary`) and weight function
         (`weight`) to the dataset.
         """
 
         if self.return_dict:
-            return self.gen_dict()
+            return self.gen_sim_dict()
+        elif not isinstance(self.n_ary, str):
+            return self.gen_sim_array(self.n_ary, self.weight)
         else:
             return getattr(self, f"{self.n_ary.lower()}_{self.weight}")() 
 
-    def gen_sim_dict(self): 
+    def _calculate_counters(self):
+        """Calculates the counters the indices are evaluated from."""
+        return calculate_counters(self.data, self.n_objects, self.c_threshold, self.w_factor, self.backend)
+
+    def gen_sim_dict(self):
         """
         Generates a dictionary of all similarity indices.
         """
         return {outer_key: {inner_key: inner_func() for inner_key, inner_func in inner_dict.items()}
             for outer_key, inner_dict in self.index_functions.items()}
 
+    def gen_sim_array(self, n_ary = None, weight = None):
+        """
+        Generates a structured array of similarity indices, all from the counters of one pass.
+
+        Arguments
+        ---------
+        n_ary : list, default = None
+            initials of the desired similarity indices.
+            None : every index of `INDICES` ('RR' and 'SM' for 'nw_nw').
+
+        weight : {None, 'w', 'nw', 'nw_nw'}, default = None
+            initials of the desired weighting factor, the fields are named by index.
+            None : every weighting factor, the fields are named '{n_ary}_{weight}'.
+
+        Returns
+        -------
+        sims : np.ndarray
+            structured array with one float field per index, a single record for
+            `SimilarityIndex` or one record per row for `BatchSimilarityIndex`.
+
+        Examples
+        --------
+        >>> sims = SimilarityIndex(c_total, n_objects).gen_sim_array()
+        >>> sims['RR_nw'], sims['SM_w']
+        >>> sims = BatchSimilarityIndex(c_totals, 2, n_ary = ['RR', 'SM'])()
+        >>> sims['RR'], sims['SM']
+        """
+        fields = []
+        for w in ([weight] if weight else ['w', 'nw', 'nw_nw']):
+            if n_ary is not None:
+                names = n_ary
+            elif w == 'nw_nw':
+                names = ['RR', 'SM']
+            else:
+                names = INDICES
+            fields += [(name if weight else f"{name}_{w}", name, w) for name in names]
+        sims = np.empty(np.shape(self.counters['a']), dtype = [(field, 'f8') for field, _, _ in fields])
+        for field, name, w in fields:
+            sims[field] = getattr(self, f"{name.lower()}_{w}")()
+        return sims
+
 
     # Calculate for individual Index Functions
     # Weighted Indices
@@ -203,23 +434,23 @@ class SimilarityIndex:
         return bub_w
 
     def ct1_w(self):
-        ct1_w = (log(1 + self.counters['w_a'] + self.counters['w_d']))/\
-                (log(1 + self.counters['w_p']))
+        ct1_w = (np.log(1 + self.counters['w_a'] + self.counters['w_d']))/\
+                (np.log(1 + self.counters['w_p']))
         return ct1_w
 
     def ct2_w(self):
-        ct2_w = (log(1 + self.counters['w_p']) - log(1 + self.counters['total_w_dis']))/\
-                (log(1 + self.counters['w_p']))
+        ct2_w = (np.log(1 + self.counters['w_p']) - np.log(1 + self.counters['total_w_dis']))/\
+                (np.log(1 + self.counters['w_p']))
         return ct2_w
     
     def ct3_w(self):
-        ct3_w = (log(1 + self.counters['w_a']))/\
-                (log(1 + self.counters['w_p']))
+        ct3_w = (np.log(1 + self.counters['w_a']))/\
+                (np.log(1 + self.counters['w_p']))
         return ct3_w
 
     def ct4_w(self):
-        ct4_w = (log(1 + self.counters['w_a']))/\
-                (log(1 + self.counters['w_a'] + self.counters['total_w_dis']))
+        ct4_w = (np.log(1 + self.counters['w_a']))/\
+                (np.log(1 + self.counters['w_a'] + self.counters['total_w_dis']))
         return ct4_w
 
     def fai_w(self):
@@ -284,23 +515,23 @@ class SimilarityIndex:
         return bub_nw
 
     def ct1_nw(self):
-        ct1_nw = (log(1 + self.counters['w_a'] + self.counters['w_d']))/\
-                (log(1 + self.counters['p']))
+        ct1_nw = (np.log(1 + self.counters['w_a'] + self.counters['w_d']))/\
+                (np.log(1 + self.counters['p']))
         return ct1_nw
 
     def ct2_nw(self):
-        ct2_nw = (log(1 + self.counters['w_p']) - log(1 + self.counters['total_w_dis']))/\
-                (log(1 + self.counters['p']))
+        ct2_nw = (np.log(1 + self.counters['w_p']) - np.log(1 + self.counters['total_w_dis']))/\
+                (np.log(1 + self.counters['p']))
         return ct2_nw
 
     def ct3_nw(self):
-        ct3_nw = (log(1 + self.counters['w_a']))/\
-                (log(1 + self.counters['p']))
+        ct3_nw = (np.log(1 + self.counters['w_a']))/\
+                (np.log(1 + self.counters['p']))
         return ct3_nw
 
     def ct4_nw(self):
-        ct4_nw = (log(1 + self.counters['w_a']))/\
-                (log(1 + self.counters['a'] + self.counters['total_dis']))
+        ct4_nw = (np.log(1 + self.counters['w_a']))/\
+                (np.log(1 + self.counters['a'] + self.counters['total_dis']))
         return ct4_nw
 
     def fai_nw(self):
@@ -364,17 +595,486 @@ class SimilarityIndex:
                 (self.counters['p'])
         return sm_nw_nw
 
-def calculate_medoid(data, n_ary = 'RR', w_factor = 'fraction', weight = 'nw', c_total = None):
+class BatchSimilarityIndex(SimilarityIndex):
+    """Vectorized `SimilarityIndex` over a stack of columnwise sums.
+
+    `data` is a 2D array with one columnwise sum per row and `n_objects` is
+    either a scalar or an array with one number of objects per row. Every
+    index is evaluated as an array expression and returns one value per row.
+
+    Examples
+    --------
+    >>> c_totals = c0 + medoid  # one pair of objects per row
+    >>> sims = BatchSimilarityIndex(c_totals, 2, n_ary='SM')()
+    """
+    def _calculate_counters(self):
+        """Calculates the counters of every row at once."""
+        return calculate_counters_batch(self.data, self.n_objects, self.c_threshold, self.w_factor, self.backend)
+
+# Number of set bits of every byte, the popcount fallback for NumPy < 2.0
+_POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype = np.uint8)
+
+def popcount(bits):
+    """Count the set bits of each object, summed over its packed words
+
+    Arguments
+    ---------
+    bits : np.ndarray
+        uint8 array of packed words, the last axis holds the words of one object
+        and its length is a multiple of 8 bytes.
+
+    Returns
+    -------
+    counts : np.ndarray
+        np.array with the number of set bits of each object.
+    """
+    bits = np.ascontiguousarray(bits)
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(bits.view(np.uint64)).sum(axis = -1, dtype = np.int64)
+    return _POPCOUNT_TABLE[bits].sum(axis = -1, dtype = np.int64)
+
+class PackedFingerprints:
+    """Binary objects stored 1 bit per feature, see `pack_fingerprints`
+
+    The features of each object are packed with `np.packbits` into 64-bit
+    words (stored as uint8, padded with zeros), 64x less memory than float64.
+    The esim functions that take `data` (`calculate_counters`, `calculate_c_total`,
+    `calculate_comp_sim_array`, `calculate_union_sim_array`, `calculate_medoid`,
+    `calculate_outlier`, `calculate_pairwise_sim`) accept it in place of the dense
+    array and unpack one block of objects at a time. Pairs of packed objects are
+    compared with popcounts, see `PackedPairSimilarityIndex`.
+
+    Attributes
+    ----------
+    bits : np.ndarray
+        uint8 array of shape (n_objects, n_bytes) with the packed objects.
+    n_features : int
+        Number of features of each object.
+    """
+    def __init__(self, bits, n_features):
+        self.bits = bits
+        self.n_features = n_features
+
+    def __len__(self):
+        return len(self.bits)
+
+    def __getitem__(self, index):
+        """Returns the objects selected by `index` (int, slice or array), still packed"""
+        bits = self.bits[index]
+        if bits.ndim == 1:
+            bits = bits[None, :]
+        return PackedFingerprints(bits, self.n_features)
+
+    @property
+    def shape(self):
+        """Shape of the dense objects, (n_objects, n_features)"""
+        return (len(self.bits), self.n_features)
+
+    @property
+    def nbytes(self):
+        return self.bits.nbytes
+
+    def unpack(self, start = None, stop = None):
+        """Returns the dense uint8 objects from `start` to `stop`"""
+        return np.unpackbits(self.bits[start:stop], axis = 1, count = self.n_features)
+
+    def c_total(self, chunk_size = None):
+        """Columnwise sum, counting the set bits of each bit position over blocks of objects"""
+        n_bytes = self.bits.shape[1]
+        chunk_size = chunk_size or max(1, 2**24 // n_bytes)
+        c_total = np.zeros(8 * n_bytes)
+        for i in range(0, len(self.bits), chunk_size):
+            block = self.bits[i:i + chunk_size]
+            # np.packbits is big-endian, feature j is the bit (128 >> j % 8) of byte j // 8
+            for bit in range(8):
+                c_total[bit::8] += np.count_nonzero(block & (128 >> bit), axis = 0)
+        return c_total[:self.n_features]
+
+def pack_fingerprints(data, chunk_size = None):
+    """Pack binary objects 1 bit per feature
+
+    Arguments
+    ---------
+    data : np.ndarray
+        np.array of shape (n_objects, n_features) with 0/1 values, can be memory-mapped.
+
+    chunk_size : int, default = None
+        Number of objects packed per block.
+
+    Returns
+    -------
+    packed : PackedFingerprints
+        The packed objects, with each row padded to a multiple of 64 bits.
+    """
+    if isinstance(data, PackedFingerprints):
+        return data
+    n_objects, n_features = data.shape
+    n_bytes = 8 * ceil(n_features / 64)
+    chunk_size = _get_chunk_size(n_features, chunk_size, n_temporaries = 1)
+    bits = np.zeros((n_objects, n_bytes), dtype = np.uint8)
+    for i in range(0, n_objects, chunk_size):
+        block = np.asarray(data[i:i + chunk_size])
+        if not np.all((block == 0) | (block == 1)):
+            raise ValueError("Only binary objects can be bit-packed")
+        bits[i:i + chunk_size, :ceil(n_features / 8)] = np.packbits(block.astype(bool), axis = 1)
+    return PackedFingerprints(bits, n_features)
+
+def _dense_rows(data, start, stop):
+    """Objects `start` to `stop` of `data` as a dense array, unpacked from `PackedFingerprints`"""
+    if isinstance(data, PackedFingerprints):
+        return data.unpack(start, stop)
+    return data[start:stop]
+
+class PackedPairSimilarityIndex(BatchSimilarityIndex):
+    """Vectorized `SimilarityIndex` of pairs of bit-packed binary objects
+
+    `data` is a tuple of two `PackedFingerprints` whose `bits` broadcast against
+    each other, e.g. all the objects of a set and one object, and `n_objects` is 2.
+    Every feature of a pair has a columnwise sum of 0, 1 or 2, so the counters
+    only depend on how many features fall in each case: the popcounts of the XOR
+    (sum 1) and of the AND (sum 2) of the packed words. No dense sum is built.
+
+    Examples
+    --------
+    >>> packed = pack_fingerprints(data)
+    >>> sims = PackedPairSimilarityIndex((packed, packed[medoid]), 2, n_ary='SM')()
+    """
+    def _calculate_counters(self):
+        """Calculates the counters of every pair from the popcounts of its packed words."""
+        data_1, data_2 = self.data
+        n_features = data_1.n_features
+        n_2 = popcount(data_1.bits & data_2.bits)
+        n_1 = popcount(data_1.bits ^ data_2.bits)
+        n_0 = n_features - n_1 - n_2
+        # Counters of a single feature with a columnwise sum of 0, 1 and 2
+        per_sum = calculate_counters_batch(np.arange(3.).reshape(3, 1), 2, self.c_threshold, self.w_factor)
+        return {key: n_0 * value[0] + n_1 * value[1] + n_2 * value[2] for key, value in per_sum.items()}
+
+def calculate_pairwise_sim(data_1, data_2, n_ary = 'RR', w_factor = 'fraction', weight = 'nw',
+                           c_threshold = None, chunk_size = None, memory_budget = None, backend = 'numpy'):
+    """Calculate the binary similarity between every object of `data_1` and every object of `data_2`
+
+    Arguments
+    ---------
+    data_1 : {np.ndarray, PackedFingerprints}
+        np.array of shape (n_objects_1, n_features).
+
+    data_2 : {np.ndarray, PackedFingerprints}
+        np.array of shape (n_objects_2, n_features).
+
+    n_ary : {str, list}
+        string with the initials of the desired similarity index.
+        list : initials of several indices evaluated from the same counters,
+        the result is a structured array with one field per index.
+
+    w_factor : str, default = 'fraction'
+        desired weighing factors for the counters
+
+    weight : str, default = 'nw'
+        string with the initials of the desired weighting factor.
+
+    c_threshold : {None, 'dissimilar', int}
+        Coincidence threshold.
+
+    chunk_size : int, default = None
+        Maximum number of pairs evaluated per vectorized tile.
+        None : derived from `memory_budget`, or about 2**22 elements (pairs * n_features) per tile.
+
+    memory_budget : int, default = None
+        Maximum number of bytes of temporaries per tile, used when `chunk_size` is None.
+        The output matrix itself is not bounded, see `calculate_pairwise_avg_sim`.
+
+    backend : {"numpy", "numba"}, default = "numpy"
+        Backend of the counters, see `calculate_counters_batch`.
+
+    Returns
+    -------
+    sims : np.ndarray
+        np.array of shape (n_objects_1, n_objects_2) with the pairwise similarities.
+    """
+    n_features = data_1.shape[1]
+    if data_2.shape[1] != n_features:
+        raise ValueError("Dimensions of the objects in both sets differ")
+    chunk_size = _get_chunk_size(n_features, chunk_size, memory_budget)
+    n_cols = min(len(data_2), chunk_size)
+    n_rows = max(1, chunk_size // max(1, n_cols))
+
+    sims = np.empty((len(data_1), len(data_2)), dtype = _sims_dtype(n_ary))
+    for i, j, tile in _pairwise_tiles(data_1, data_2, n_rows, n_cols, n_ary, w_factor, weight,
+                                      c_threshold, backend):
+        sims[i:i + tile.shape[0], j:j + tile.shape[1]] = tile
+    return sims
+
+def calculate_pairwise_avg_sim(data_1, data_2, n_ary = 'RR', w_factor = 'fraction', weight = 'nw',
+                               c_threshold = None, chunk_size = None, memory_budget = None, backend = 'numpy'):
+    """Calculate the average binary similarity of every object of `data_1` with all the objects of `data_2`
+
+    Blocked version of `calculate_pairwise_sim(...).mean(axis = 1)`: `data_1` and `data_2`
+    are tiled, the similarities of each tile are summed per row of `data_1` and the
+    full (n_objects_1, n_objects_2) matrix is never materialized. Works on
+    memory-mapped arrays, only one tile of `data_2` is read at a time.
+
+    Arguments
+    ---------
+    data_1 : {np.ndarray, PackedFingerprints}
+        np.array of shape (n_objects_1, n_features).
+
+    data_2 : {np.ndarray, PackedFingerprints}
+        np.array of shape (n_objects_2, n_features).
+
+    n_ary : {str, list}
+        string with the initials of the desired similarity index.
+        list : initials of several indices evaluated from the same counters,
+        the result is a structured array with one field per index.
+
+    w_factor : str, default = 'fraction'
+        desired weighing factors for the counters
+
+    weight : str, default = 'nw'
+        string with the initials of the desired weighting factor.
+
+    c_threshold : {None, 'dissimilar', int}
+        Coincidence threshold.
+
+    chunk_size : int, default = None
+        Maximum number of pairs evaluated per tile.
+        None : derived from `memory_budget`, or about 2**22 elements per tile.
+
+    memory_budget : int, default = None
+        Maximum number of bytes of temporaries per tile, used when `chunk_size` is None.
+
+    backend : {"numpy", "numba"}, default = "numpy"
+        Backend of the counters, see `calculate_counters_batch`.
+
+    Returns
+    -------
+    avg_sims : np.ndarray
+        np.array of shape (n_objects_1,) with the average similarity of each object of `data_1`.
+    """
+    n_features = data_1.shape[1]
+    if data_2.shape[1] != n_features:
+        raise ValueError("Dimensions of the objects in both sets differ")
+    chunk_size = _get_chunk_size(n_features, chunk_size, memory_budget)
+    n_cols = min(len(data_2), chunk_size)
+    n_rows = max(1, chunk_size // max(1, n_cols))
+
+    sums = np.zeros(len(data_1), dtype = _sims_dtype(n_ary))
+    names = sums.dtype.names
+    for i, j, tile in _pairwise_tiles(data_1, data_2, n_rows, n_cols, n_ary, w_factor, weight,
+                                      c_threshold, backend):
+        if names is None:
+            sums[i:i + len(tile)] += tile.sum(axis = 1)
+        else:
+            for name in names:
+                sums[name][i:i + len(tile)] += tile[name].sum(axis = 1)
+    if names is None:
+        sums /= len(data_2)
+    else:
+        for name in names:
+            sums[name] /= len(data_2)
+    return sums
+
+def _pairwise_tiles(data_1, data_2, n_rows, n_cols, n_ary, w_factor, weight, c_threshold, backend):
+    """Yields the row and column offsets and the (n_rows, n_cols) similarities of each tile of pairs"""
+    n_features = data_1.shape[1]
+    packed = isinstance(data_1, PackedFingerprints) or isinstance(data_2, PackedFingerprints)
+    if packed:
+        data_1, data_2 = pack_fingerprints(data_1), pack_fingerprints(data_2)
+    for i in range(0, len(data_1), n_rows):
+        x = data_1[i:i + n_rows] if packed else np.asarray(data_1[i:i + n_rows])
+        for j in range(0, len(data_2), n_cols):
+            if packed:
+                y = data_2[j:j + n_cols]
+                tile = PackedPairSimilarityIndex((PackedFingerprints(x.bits[:, None, :], n_features),
+                                                  PackedFingerprints(y.bits[None, :, :], n_features)), 2,
+                                                 n_ary = n_ary, w_factor = w_factor, weight = weight,
+                                                 c_threshold = c_threshold)()
+                yield i, j, tile
+                continue
+            y = np.asarray(data_2[j:j + n_cols])
+            c_totals = (x[:, None, :] + y[None, :, :]).reshape(-1, n_features)
+            tile = BatchSimilarityIndex(c_totals, 2, n_ary = n_ary, w_factor = w_factor,
+                                        weight = weight, c_threshold = c_threshold, backend = backend)()
+            yield i, j, tile.reshape(len(x), len(y))
+
+def _sims_dtype(n_ary):
+    """dtype of the similarities of `n_ary`, a structured dtype with one field per index for a list"""
+    if isinstance(n_ary, str):
+        return np.float64
+    return np.dtype([(name, 'f8') for name in n_ary])
+
+def _get_chunk_size(n_features, chunk_size = None, memory_budget = None, n_temporaries = 6):
+    """Number of rows evaluated per block
+
+    An explicit `chunk_size` wins, otherwise the rows are sized so the
+    `n_temporaries` float64 arrays of one block fit in `memory_budget` bytes,
+    otherwise about 2**22 elements per block.
+    """
+    if chunk_size:
+        return int(chunk_size)
+    if memory_budget:
+        return max(1, int(memory_budget // (n_features * 8 * n_temporaries)))
+    return max(1, 2**22 // n_features)
+
+def calculate_c_total(data, chunk_size = None, memory_budget = None):
+    """Calculate the columnwise sum in one pass over blocks of rows
+
+    Works on memory-mapped arrays without loading them fully, see `np.load(..., mmap_mode='r')`.
+
+    Arguments
+    ---------
+    data : {np.array, PackedFingerprints}
+        np.array of all the binary objects
+
+    chunk_size : int, default = None
+        Number of objects summed per block.
+
+    memory_budget : int, default = None
+        Maximum number of bytes per block, used when `chunk_size` is None.
+
+    Returns
+    -------
+    c_total : np.ndarray
+        np.array with the columnwise sums.
+    """
+    if isinstance(data, PackedFingerprints):
+        return data.c_total(chunk_size)
+    n_objects, n_features = data.shape
+    chunk_size = _get_chunk_size(n_features, chunk_size, memory_budget, n_temporaries = 1)
+    c_total = np.zeros(n_features)
+    for i in range(0, n_objects, chunk_size):
+        c_total += np.sum(data[i:i + chunk_size], axis = 0)
+    return c_total
+
+def calculate_comp_sim_array(data, n_ary = 'RR', w_factor = 'fraction', weight = 'nw', c_total = None,
+                             c_threshold = None, chunk_size = None, memory_budget = None, backend = 'numpy'):
+    """Calculate the complementary similarity of every object in one vectorized pass
+
+    The complementary similarity of an object is the similarity of the set
+    without it, which is evaluated from `c_total - data[i]`. The complementary
+    sums are built in blocks of rows so the full-size copy is never materialized.
+
+    Arguments
+    ---------
+    data : {np.array, PackedFingerprints}
+        np.array of all the binary objects
+
+    n_ary : {str, list}
+        string with the initials of the desired similarity index.
+        list : initials of several indices evaluated from the same counters,
+        the result is a structured array with one field per index.
+
+    w_factor : str, default = 'fraction'
+        desired weighing factors for the counters
+
+    weight : str, default = 'nw'
+        string with the initials of the desired weighting factor.
+
+    c_total : np.array, default = None
+        np.array with the columnwise sums.
+
+    c_threshold : {None, 'dissimilar', int}
+        Coincidence threshold.
+
+    chunk_size : int, default = None
+        Number of objects evaluated per block.
+        None : derived from `memory_budget`, or about 2**22 elements per block.
+
+    memory_budget : int, default = None
+        Maximum number of bytes of temporaries per block, used when `chunk_size` is None.
+
+    backend : {"numpy", "numba"}, default = "numpy"
+        Backend of the counters, see `calculate_counters_batch`.
+
+    Returns
+    -------
+    comp_sims : np.ndarray
+        np.array with the complementary similarity of each object.
+    """
+    n_objects, n_features = data.shape
+    chunk_size = _get_chunk_size(n_features, chunk_size, memory_budget)
+    if c_total is None:
+        c_total = calculate_c_total(data, chunk_size = chunk_size)
+    elif len(c_total) != n_features:
+        raise ValueError("Dimensions of objects and columnwise sum differ")
+
+    comp_sims = np.empty(n_objects, dtype = _sims_dtype(n_ary))
+    for i in range(0, n_objects, chunk_size):
+        comp_sums = c_total - _dense_rows(data, i, i + chunk_size)
+        comp_sims[i:i + chunk_size] = BatchSimilarityIndex(comp_sums, n_objects - 1, n_ary = n_ary, 
+                                                           w_factor = w_factor, weight = weight,
+                                                           c_threshold = c_threshold, backend = backend)()
+    return comp_sims
+
+def calculate_union_sim_array(data, c_total, n_objects, n_ary = 'RR', w_factor = 'fraction', weight = 'nw',
+                              c_threshold = None, chunk_size = None, memory_budget = None, backend = 'numpy'):
+    """Calculate the similarity of a set united with each object, for all objects in one vectorized pass
+
+    Arguments
+    ---------
+    data : {np.array, PackedFingerprints}
+        np.array of the objects added to the set one at a time.
+
+    c_total : np.array
+        np.array with the columnwise sums of the set.
+
+    n_objects : int
+        Number of objects in the set.
+
+    n_ary : {str, list}
+        string with the initials of the desired similarity index.
+        list : initials of several indices evaluated from the same counters,
+        the result is a structured array with one field per index.
+
+    w_factor : str, default = 'fraction'
+        desired weighing factors for the counters
+
+    weight : str, default = 'nw'
+        string with the initials of the desired weighting factor.
+
+    c_threshold : {None, 'dissimilar', int}
+        Coincidence threshold.
+
+    chunk_size : int, default = None
+        Number of objects evaluated per block.
+
+    memory_budget : int, default = None
+        Maximum number of bytes of temporaries per block, used when `chunk_size` is None.
+
+    backend : {"numpy", "numba"}, default = "numpy"
+        Backend of the counters, see `calculate_counters_batch`.
+
+    Returns
+    -------
+    union_sims : np.ndarray
+        np.array with the similarity of `c_total + data[i]` over `n_objects + 1` objects.
+    """
+    n_features = data.shape[1]
+    if len(c_total) != n_features:
+        raise ValueError("Dimensions of objects and columnwise sum differ")
+    chunk_size = _get_chunk_size(n_features, chunk_size, memory_budget)
+
+    union_sims = np.empty(len(data), dtype = _sims_dtype(n_ary))
+    for i in range(0, len(data), chunk_size):
+        union_sums = c_total + _dense_rows(data, i, i + chunk_size)
+        union_sims[i:i + chunk_size] = BatchSimilarityIndex(union_sums, n_objects + 1, n_ary = n_ary,
+                                                            w_factor = w_factor, weight = weight,
+                                                            c_threshold = c_threshold, backend = backend)()
+    return union_sims
+
+def calculate_medoid(data, n_ary = 'RR', w_factor = 'fraction', weight = 'nw', c_total = None,
+                     memory_budget = None, backend = 'numpy'):
     """Calculate the medoid of a set
     
     Arguments 
     --------    
-    data : np.array
+    data : {np.array, PackedFingerprints}
         np.array of all the binary objects
 
-    n_ary : str
+    n_ary : {str, list}
         string with the initials of the desired similarity index to calculate the medoid from. 
-        See gen_sim_dict description for keys
+        See gen_sim_dict description for keys. For a list of indices, returns a dictionary 
+        with the medoid of each index, all from the same counters.
     
     weight : str, default = 'nw'
         string with the initials of the desired weighting factor to calculate the medoid from.
@@ -384,72 +1084,58 @@ def calculate_medoid(data, n_ary = 'RR', w_factor = 'fraction', weight = 'nw', c
 
     c_total: np.array, default = None
         np.array with the columnwise sums.
+
+    memory_budget : int, default = None
+        Maximum number of bytes of temporaries per block of objects. Together with 
+        a memory-mapped `data` this bounds the memory used for large datasets.
+
+    backend : {"numpy", "numba"}, default = "numpy"
+        Backend of the counters, see `calculate_counters_batch`.
     """
-        
-    if c_total and len(data[0]) != c_total: raise ValueError("Dimensions of objects and columnwise sum differ")
-    elif not c_total: c_total = np.sum(data, axis = 0)
-    n_objects = len(data)
-    index = n_objects + 1
-    min_sim = 1.01
-    comp_sums = c_total - data
-    for i, obj in enumerate(comp_sums):
-        SI = SimilarityIndex(obj, n_objects = n_objects - 1, n_ary = n_ary, w_factor = w_factor, weight = weight)
-        sim_index = SI()
-        if sim_index < min_sim:
-            min_sim = sim_index
-            index = i
-        else:
-            pass
-    return index
+    comp_sims = calculate_comp_sim_array(data, n_ary = n_ary, w_factor = w_factor, weight = weight,
+                                         c_total = c_total, memory_budget = memory_budget, backend = backend)
+    if not isinstance(n_ary, str):
+        return {name: int(np.nanargmin(comp_sims[name])) for name in n_ary}
+    return int(np.nanargmin(comp_sims))
 
-def calculate_outlier(data, n_ary = 'RR', w_factor = 'fraction', weight = 'nw', c_total = None):
-    """Calculate the medoid of a set
+def calculate_outlier(data, n_ary = 'RR', w_factor = 'fraction', weight = 'nw', c_total = None,
+                      memory_budget = None, backend = 'numpy'):
+    """Calculate the outlier of a set
     Arguments 
     --------    
-    data : np.array
+    data : {np.array, PackedFingerprints}
         np.array of all the binary objects
 
-    n_ary : str
-        string with the initials of the desired similarity index to calculate the medoid from. 
-        See gen_sim_dict description for keys
+    n_ary : {str, list}
+        string with the initials of the desired similarity index to calculate the outlier from. 
+        See gen_sim_dict description for keys. For a list of indices, returns a dictionary 
+        with the outlier of each index, all from the same counters.
     
     weight : str, default = 'nw'
-        string with the initials of the desired weighting factor to calculate the medoid from.
+        string with the initials of the desired weighting factor to calculate the outlier from.
     
     w_factor : str, default = 'fraction'
         desired weighing factors for the counters
 
     c_total: np.array, default = None
         np.array with the columnwise sums.
-    """
 
-    if c_total and len(data[0]) != c_total: raise ValueError("Dimensions of objects and columnwise sum differ")
-    elif not c_total: c_total = np.sum(data, axis = 0)
-    n_objects = len(data)
-    index = n_objects + 1
-    max_sim = -0.01
-    comp_sums = c_total - data 
-    for i, obj in enumerate(comp_sums):
-        SI = SimilarityIndex(obj, n_objects = n_objects - 1, n_ary = n_ary, w_factor = w_factor, weight = weight)
-        sim_index = SI()
-        if sim_index > max_sim:
-            max_sim = sim_index
-            index = i
-        else:
-            pass
-    return index
+    memory_budget : int, default = None
+        Maximum number of bytes of temporaries per block of objects. Together with 
+        a memory-mapped `data` this bounds the memory used for large datasets.
 
-def calculate_comp_sim(data, c_threshold = None, n_ary = 'RR', w_factor = 'fraction', weight = 'nw', c_total = None):
-    """Calculate the complementary similarity for all elements"""
+    backend : {"numpy", "numba"}, default = "numpy"
+        Backend of the counters, see `calculate_counters_batch`.
+    """
+    comp_sims = calculate_comp_sim_array(data, n_ary = n_ary, w_factor = w_factor, weight = weight,
+                                         c_total = c_total, memory_budget = memory_budget, backend = backend)
+    if not isinstance(n_ary, str):
+        return {name: int(np.nanargmax(comp_sims[name])) for name in n_ary}
+    return int(np.nanargmax(comp_sims))
 
-    if c_total and len(data[0]) != c_total: raise ValueError("Dimensions of objects and columnwise sum differ")
-    elif not c_total: c_total = np.sum(data, axis = 0)
-
-    n_objects = len(data)   
-    comp_sums = c_total - data
-    total = []
-    for i, obj in enumerate(comp_sums):
-        SI = SimilarityIndex(obj, n_objects = n_objects - 1, n_ary = n_ary, w_factor = w_factor, weight = weight)
-        sim_index = SI()
-        total.append((i, sim_index))
-    return total
\ No newline at end of file
+def calculate_comp_sim(data, c_threshold = None, n_ary = 'RR', w_factor = 'fraction', weight = 'nw', c_total = None,
+                       backend = 'numpy'):
+    """Calculate the complementary similarity for all elements"""
+    comp_sims = calculate_comp_sim_array(data, n_ary = n_ary, w_factor = w_factor, weight = weight,
+                                         c_total = c_total, c_threshold = c_threshold, backend = backend)
+    return list(enumerate(comp_sims))
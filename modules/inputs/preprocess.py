@@ -1,10 +1,53 @@
 import glob
-from itertools import chain
+import os
+from concurrent.futures import ProcessPoolExecutor
 import MDAnalysis as mda
 import numpy as np
 import re
 
-def gen_traj_numpy(prmtopFileName, trajFileName, atomSel):
+def iter_traj_numpy(prmtopFileName, trajFileName, atomSel, start=None, stop=None, step=None,
+                    chunk_frames=1000, dtype=float):
+    """Reads in a trajectory and yields the coordinates of the selected atoms 
+    in chunks of frames, so the trajectory never needs to fit in memory.
+    
+    Parameters
+    ----------
+    prmtopFileName : str
+        The file path of the topology file.
+    trajFileName : str
+        The file path of the trajectory file.
+    atomSel : str
+        The atom selection string. For example, 'resid 3:12 and name N H CA C O'.
+    start, stop, step : {int, None}, optional
+        The frame range to read, as in `trajectory[start:stop:step]`. `step` keeps 
+        every step-th frame (the `sieve` of `assign_labels.py`). Defaults to None.
+    chunk_frames : int, optional
+        The number of frames per chunk. Defaults to 1000.
+    dtype : np.dtype, optional
+        The dtype of the coordinates, e.g. np.float32 to halve the memory. 
+        Defaults to float.
+
+    Yields
+    ------
+    np.ndarray
+        The 2D array of the coordinates of one chunk, shape (n_frames_in_chunk, n_atoms * 3).
+    """
+    coord = mda.Universe(prmtopFileName, trajFileName)
+    atomSel = coord.select_atoms(atomSel)
+    frames = coord.trajectory[start:stop:step]
+    chunk = np.empty((min(chunk_frames, len(frames)), atomSel.n_atoms * 3), dtype=dtype)
+    i = 0
+    for _ in frames:
+        chunk[i] = atomSel.positions.ravel()
+        i += 1
+        if i == len(chunk):
+            yield chunk.copy()
+            i = 0
+    if i:
+        yield chunk[:i].copy()
+
+def gen_traj_numpy(prmtopFileName, trajFileName, atomSel, start=None, stop=None, step=None,
+                   dtype=float, output=None, chunk_frames=1000):
     """Reads in a trajectory and returns a 2D numpy array of the coordinates 
     of the selected atoms.
     
@@ -18,31 +61,188 @@ def gen_traj_numpy(prmtopFileName, trajFileName, atomSel):
         The atom selection string. For example, 'resid 3:12 and name N H CA C O'.
         View details in the MDAnalysis documentation: 
         https://docs.mdanalysis.org/stable/documentation_pages/selections.html
+    start, stop, step : {int, None}, optional
+        The frame range to read, as in `trajectory[start:stop:step]`. `step` keeps 
+        every step-th frame (the `sieve` of `assign_labels.py`). Defaults to None.
+    dtype : np.dtype, optional
+        The dtype of the coordinates, e.g. np.float32 to halve the memory. 
+        Defaults to float.
+    output : {None, str}, optional
+        The path of a `.npy` file to write the coordinates to through a memory map. 
+        If None, the coordinates are kept in memory. Defaults to None.
+    chunk_frames : int, optional
+        The number of frames read per chunk. Defaults to 1000.
 
     Returns
     -------
     traj_numpy : np.ndarray
-        The 2D numpy array of the coordinates of the selected atoms.
+        The 2D numpy array of the coordinates of the selected atoms, 
+        memory-mapped if `output` is given.
         
     Examples
     --------
     >>> traj_numpy = gen_traj_numpy('aligned_tau.pdb', 'aligned_tau.dcd', 
                                     'resid 3:12 and name N CA C')
+    >>> traj_numpy = gen_traj_numpy('aligned_tau.pdb', 'aligned_tau.dcd', 
+                                    'resid 3:12 and name N CA C', step=10, 
+                                    output='aligned_tau.npy')
     """
     coord = mda.Universe(prmtopFileName,trajFileName)
     print('Number of atoms in trajectory:', coord.atoms.n_atoms)
     print('Number of frames in trajectory:', coord.trajectory.n_frames)
-    atomSel = coord.select_atoms(atomSel)
-    print('Number of atoms in selection:', atomSel.n_atoms)
-    # Create traj data of the atom selection
-    traj_numpy = np.empty((coord.trajectory.n_frames,atomSel.n_atoms, 3), dtype=float)
-    # Loop every frame and store the coordinates of the atom selection
-    for ts in coord.trajectory:
-        traj_numpy[ts.frame,:] = atomSel.positions
-    # Flatten 3D array to 2D array
-    traj_numpy = traj_numpy.reshape(traj_numpy.shape[0],-1)
+    n_atoms = coord.select_atoms(atomSel).n_atoms
+    print('Number of atoms in selection:', n_atoms)
+    # Preallocate the 2D traj data of the atom selection for the frames read
+    shape = (len(coord.trajectory[start:stop:step]), n_atoms * 3)
+    if output is None:
+        traj_numpy = np.empty(shape, dtype=dtype)
+    else:
+        traj_numpy = np.lib.format.open_memmap(output, mode='w+', dtype=dtype, shape=shape)
+    row = 0
+    for chunk in iter_traj_numpy(prmtopFileName, trajFileName, atomSel, start=start, stop=stop,
+                                 step=step, chunk_frames=chunk_frames, dtype=dtype):
+        traj_numpy[row:row + len(chunk)] = chunk
+        row += len(chunk)
+    if output is not None:
+        traj_numpy.flush()
     return traj_numpy
 
+def _crd_layout(file, break_line):
+    """Reads the layout of the frames of a CRD/MDCRD file from its first frame.
+
+    Every frame of a cpptraj CRD file has the same fixed-width layout: `break_line` 
+    lines of 8-character fields. 
+
+    Returns
+    -------
+    header_bytes : int
+        The number of bytes of the title line.
+    frame_bytes : int
+        The number of bytes of one frame, newlines included.
+    field_columns : np.ndarray
+        The byte position of every character of every field within a frame.
+    """
+    with open(file, 'rb') as infile:
+        header_bytes = len(infile.readline())
+        field_columns = []
+        frame_bytes = 0
+        for _ in range(break_line):
+            line = infile.readline()
+            if not line:
+                raise ValueError(f"{file} has less than one frame of {break_line} lines")
+            n_chars = len(line.rstrip())
+            n_fields = -(-n_chars // 8)
+            field_columns.append(frame_bytes + np.arange(n_fields * 8))
+            frame_bytes += len(line)
+    field_columns = np.concatenate(field_columns)
+    if field_columns[-1] >= frame_bytes:
+        raise ValueError(f"Last field of the frames of {file} is shorter than 8 characters")
+    return header_bytes, frame_bytes, field_columns
+
+def iter_crd_frames(file, break_line, chunk_frames=10000, dtype=np.float32):
+    """Reads a CRD/MDCRD file in large binary blocks and yields its frames in chunks.
+
+    The 8-character fields are gathered from each block of frames with a fixed 
+    column index and parsed in one vectorized conversion, so the file text is 
+    never split into Python strings.
+
+    Parameters
+    ----------
+    file : str
+        The file path of the CRD/MDCRD file.
+    break_line : int
+        The number of lines per frame.
+    chunk_frames : int, optional
+        The number of frames read and parsed per block. Defaults to 10000.
+    dtype : np.dtype, optional
+        The dtype of the frames. Defaults to np.float32.
+
+    Yields
+    ------
+    np.ndarray
+        The frames of one block, shape (n_frames_in_block, n_fields).
+    """
+    header_bytes, frame_bytes, field_columns = _crd_layout(file, break_line)
+    n_frames = crd_n_frames(file, break_line)
+    with open(file, 'rb') as infile:
+        infile.seek(header_bytes)
+        for start in range(0, n_frames, chunk_frames):
+            n_block = min(chunk_frames, n_frames - start)
+            block = infile.read(n_block * frame_bytes)
+            if len(block) < n_block * frame_bytes:
+                block += b'\n' * (n_block * frame_bytes - len(block))
+            chars = np.frombuffer(block, dtype=np.uint8).reshape(n_block, frame_bytes)
+            fields = np.ascontiguousarray(chars[:, field_columns]).view('S8')
+            yield fields.astype(dtype)
+
+def crd_n_frames(file, break_line):
+    """Returns the number of frames of a CRD/MDCRD file from its size.
+
+    Parameters
+    ----------
+    file : str
+        The file path of the CRD/MDCRD file.
+    break_line : int
+        The number of lines per frame.
+    """
+    header_bytes, frame_bytes, _ = _crd_layout(file, break_line)
+    body_bytes = os.path.getsize(file) - header_bytes
+    n_frames, remainder = divmod(body_bytes, frame_bytes)
+    # The last newline of the file may be missing
+    if remainder == frame_bytes - 1:
+        n_frames += 1
+    elif remainder:
+        raise ValueError(f"{file} is not a whole number of frames of {break_line} lines, check break_line")
+    return n_frames
+
+def read_crd(file, break_line, output=None, chunk_frames=10000, dtype=np.float32):
+    """Reads a CRD/MDCRD file into a preallocated array.
+
+    Parameters
+    ----------
+    file : str
+        The file path of the CRD/MDCRD file.
+    break_line : int
+        The number of lines per frame.
+    output : {None, str, np.ndarray}, optional
+        None : a new array in memory.
+        str : the path of a `.npy` file written through a memory map, so the frames 
+        never need to fit in memory.
+        np.ndarray : an existing array of shape (n_frames, n_fields) to fill.
+        Defaults to None.
+    chunk_frames : int, optional
+        The number of frames read and parsed per block. Defaults to 10000.
+    dtype : np.dtype, optional
+        The dtype of the frames. Defaults to np.float32.
+
+    Returns
+    -------
+    np.ndarray
+        The frames of the file, memory-mapped if `output` is a path.
+    
+    Examples
+    --------
+    >>> frames = read_crd('clusttraj.c0', break_line=4)
+    >>> frames = read_crd('clusttraj.c0', break_line=4, output='clusttraj.c0.npy')
+    """
+    _, _, field_columns = _crd_layout(file, break_line)
+    shape = (crd_n_frames(file, break_line), len(field_columns) // 8)
+    if output is None:
+        frames = np.empty(shape, dtype=dtype)
+    elif isinstance(output, str):
+        frames = np.lib.format.open_memmap(output, mode='w+', dtype=dtype, shape=shape)
+    else:
+        frames = output
+        if frames.shape != shape:
+            raise ValueError(f"Output shape {frames.shape} differs from the file shape {shape}")
+    start = 0
+    for block in iter_crd_frames(file, break_line, chunk_frames=chunk_frames, dtype=dtype):
+        frames[start:start + len(block)] = block
+        start += len(block)
+    if isinstance(frames, np.memmap):
+        frames.flush()
+    return frames
+
 class Normalizer:
     """Class for normalizing data from cpptraj CRD/MDCRD files.
 
@@ -63,7 +263,7 @@ class Normalizer:
     normed_data : np.ndarray
         The normalized input data as a numpy array.
     c_total : np.ndarray
-        The sum of columns of the normalized input data.
+        The sum of columns of `1 - |v3_norm - mean|`.
     min : float
         The minimum value of the input data.
     max : float
@@ -112,14 +312,41 @@ class Normalizer:
         else:
             self.min = np.min(self.data)
             self.max = np.max(self.data)
+        self.custom_avg = custom_avg
+        # The normalized arrays are only computed when first requested
+        self._v3_norm = None
+        self._v2_norm = None
+        self._c_total = None
 
-        self.v3_norm = (self.data - self.min) / (self.max - self.min)
-        if custom_avg is not None:
-            self.avg = custom_avg
-        else:
-            self.avg = np.mean(self.v3_norm, axis=0)
-        self.v2_norm = 1 - np.abs(self.v3_norm - self.avg)
-        self.c_total = np.sum(1 - np.abs(self.v3_norm - np.mean(self.v3_norm, axis=0)), axis=0)
+    @property
+    def v3_norm(self):
+        """The 'v3' normalized data, computed on first access."""
+        if self._v3_norm is None:
+            self._v3_norm = (self.data - self.min) / (self.max - self.min)
+        return self._v3_norm
+
+    @property
+    def avg(self):
+        """The average value used for the 'v2' normalization."""
+        if self.custom_avg is not None:
+            return self.custom_avg
+        return np.mean(self.v3_norm, axis=0)
+
+    @property
+    def v2_norm(self):
+        """The 'v2' normalized data, computed on first access."""
+        if self._v2_norm is None:
+            self._v2_norm = 1 - np.abs(self.v3_norm - self.avg)
+        return self._v2_norm
+
+    @property
+    def c_total(self):
+        """The 'c_total' values, computed on first access. These are the column sums 
+        of `1 - |v3_norm - mean|`, not the esim column sums returned by 
+        `StreamingNormalizer.transform_chunks`."""
+        if self._c_total is None:
+            self._c_total = np.sum(1 - np.abs(self.v3_norm - np.mean(self.v3_norm, axis=0)), axis=0)
+        return self._c_total
     
     def get_min_max(self):
         """Returns the minimum and maximum values of the input data."""
@@ -137,6 +364,304 @@ class Normalizer:
         """Returns the 'c_total' values."""
         return self.c_total
 
+class StreamingNormalizer:
+    """Class for normalizing data too large for memory, one chunk of frames at a time.
+
+    A first pass over the chunks with `partial_fit` accumulates the global minimum, 
+    maximum and column sums. A second pass with `transform` or `transform_chunks` 
+    normalizes each chunk into the requested type only, and `transform_chunks` 
+    returns the column sum of the normalized data from the same pass, the `c_total` 
+    of esim (not `Normalizer.c_total`, the column sum of `1 - |v3_norm - mean|`).
+
+    Attributes
+    ----------
+    min : float
+        The minimum value of the data seen, or the custom minimum.
+    max : float
+        The maximum value of the data seen, or the custom maximum.
+    n_samples : int
+        The number of frames seen.
+    sum : np.ndarray
+        The sum of columns of the raw data seen, accumulated in float64.
+
+    Methods
+    -------
+    partial_fit(chunk)
+        Updates the running statistics with a chunk of frames.
+    fit(chunks)
+        Updates the running statistics with every chunk of an iterable.
+    merge(other)
+        Merges the running statistics of another normalizer.
+    get_min_max()
+        Returns the minimum, maximum and average values of the data seen.
+    transform(chunk, norm_type)
+        Returns a chunk normalized to 'v2' or 'v3'.
+    transform_chunks(chunks, output, norm_type)
+        Normalizes every chunk into `output` and returns its esim `c_total`.
+
+    Examples
+    --------
+    >>> norm = StreamingNormalizer()
+    >>> norm.fit(iter_traj_numpy('aligned_tau.pdb', 'aligned_tau.dcd', 'name CA'))
+    >>> output = np.lib.format.open_memmap('normed.npy', mode='w+', dtype=np.float32, 
+                                           shape=(norm.n_samples, 3 * n_atoms))
+    >>> c_total = norm.transform_chunks(iter_traj_numpy('aligned_tau.pdb', 'aligned_tau.dcd', 
+                                                        'name CA'), output, norm_type='v3')
+    """
+    def __init__(self, custom_min=None, custom_max=None, custom_avg=None):
+        """Initialize the StreamingNormalizer class.
+        
+        Parameters
+        ----------
+        custom_min : {float, None}, optional
+            The minimum value to use for normalization. If not provided, 
+            the minimum value of the data seen is used. Defaults to None.
+        custom_max : {float, None}, optional
+            The maximum value to use for normalization. If not provided,
+            the maximum value of the data seen is used. Defaults to None.
+        custom_avg : {float, None}, optional
+            The average value to use for the 'v2' normalization. If not provided,
+            the average value of the 'v3' normalized data seen is used. Defaults to None.
+        """
+        self.custom_min = custom_min
+        self.custom_max = custom_max
+        self.custom_avg = custom_avg
+        self.min = custom_min if custom_min is not None else np.inf
+        self.max = custom_max if custom_max is not None else -np.inf
+        self.n_samples = 0
+        self.sum = None
+
+    def partial_fit(self, chunk):
+        """Updates the running minimum, maximum and column sums with a chunk of frames.
+
+        Parameters
+        ----------
+        chunk : array_like of shape (n_frames, n_features)
+            The chunk of raw frames.
+
+        Returns
+        -------
+        StreamingNormalizer
+            The normalizer itself.
+        """
+        chunk = np.asarray(chunk)
+        if len(chunk) == 0:
+            return self
+        if self.custom_min is None:
+            self.min = min(self.min, np.min(chunk))
+        if self.custom_max is None:
+            self.max = max(self.max, np.max(chunk))
+        chunk_sum = np.sum(chunk, axis=0, dtype=np.float64)
+        self.sum = chunk_sum if self.sum is None else self.sum + chunk_sum
+        self.n_samples += len(chunk)
+        return self
+
+    def fit(self, chunks):
+        """Updates the running statistics with every chunk of an iterable.
+
+        Parameters
+        ----------
+        chunks : iterable
+            The chunks of raw frames, e.g. from `iter_traj_numpy` or `iter_crd_frames`.
+
+        Returns
+        -------
+        StreamingNormalizer
+            The normalizer itself.
+        """
+        for chunk in chunks:
+            self.partial_fit(chunk)
+        return self
+
+    def merge(self, other):
+        """Merges the running statistics of another normalizer into this one,
+        e.g. the normalizers fitted on different clusters by parallel workers.
+
+        Parameters
+        ----------
+        other : StreamingNormalizer
+            The normalizer to merge.
+
+        Returns
+        -------
+        StreamingNormalizer
+            The normalizer itself.
+        """
+        if not other.n_samples:
+            return self
+        if self.custom_min is None:
+            self.min = min(self.min, other.min)
+        if self.custom_max is None:
+            self.max = max(self.max, other.max)
+        self.sum = other.sum.copy() if self.sum is None else self.sum + other.sum
+        self.n_samples += other.n_samples
+        return self
+
+    @property
+    def avg(self):
+        """The column average of the 'v3' normalized data seen, or the custom average."""
+        if self.custom_avg is not None:
+            return self.custom_avg
+        if not self.n_samples:
+            raise ValueError("StreamingNormalizer has not seen any data, call partial_fit first")
+        return (self.sum / self.n_samples - self.min) / (self.max - self.min)
+
+    def get_min_max(self):
+        """Returns the minimum, maximum and average values of the data seen."""
+        return self.min, self.max, self.avg
+
+    def transform(self, chunk, norm_type='v3'):
+        """Normalizes a chunk of frames.
+
+        Parameters
+        ----------
+        chunk : array_like of shape (n_frames, n_features)
+            The chunk of raw frames.
+        norm_type : {'v2', 'v3'}, optional
+            The type of normalization. Defaults to 'v3'.
+
+        Returns
+        -------
+        np.ndarray
+            The normalized chunk.
+        """
+        if self.max == -np.inf:
+            raise ValueError("StreamingNormalizer has not seen any data, call partial_fit first")
+        v3_norm = (np.asarray(chunk) - self.min) / (self.max - self.min)
+        if norm_type == 'v3':
+            return v3_norm
+        elif norm_type == 'v2':
+            return 1 - np.abs(v3_norm - self.avg)
+        raise ValueError(f"Unknown norm_type {norm_type}, use 'v2' or 'v3'")
+
+    def transform_chunks(self, chunks, output=None, norm_type='v3'):
+        """Normalizes every chunk into `output` and accumulates the column sum 
+        of the normalized data in the same pass.
+
+        Parameters
+        ----------
+        chunks : iterable
+            The chunks of raw frames, in order.
+        output : {None, np.ndarray}, optional
+            A preallocated array (e.g. a `.npy` memory map) with one row per frame 
+            to write the normalized frames to. If None, only `c_total` is computed. 
+            Defaults to None.
+        norm_type : {'v2', 'v3'}, optional
+            The type of normalization. Defaults to 'v3'.
+
+        Returns
+        -------
+        np.ndarray
+            The sum of columns of the normalized data, the `c_total` of esim that 
+            `calculate_medoid` and `calculate_outlier` accept. This differs from 
+            `Normalizer.c_total`, which sums `1 - |v3_norm - mean|`.
+        """
+        c_total = None
+        row = 0
+        for chunk in chunks:
+            normed_chunk = self.transform(chunk, norm_type=norm_type)
+            if output is not None:
+                output[row:row + len(normed_chunk)] = normed_chunk
+            chunk_total = np.sum(normed_chunk, axis=0, dtype=np.float64)
+            c_total = chunk_total if c_total is None else c_total + chunk_total
+            row += len(normed_chunk)
+        if output is not None and row != len(output):
+            raise ValueError(f"Wrote {row} frames to an output of {len(output)} frames")
+        return c_total
+
+def _iter_cluster(file, prmtopFileName=None, atomSel=None, break_line=None, dtype=np.float32):
+    """Returns the chunk iterator of a cluster file, a CRD/MDCRD file if `break_line` 
+    is given, otherwise a trajectory read with MDAnalysis."""
+    if break_line:
+        return iter_crd_frames(file, break_line, dtype=dtype)
+    return iter_traj_numpy(prmtopFileName, file, atomSel, dtype=dtype)
+
+def _fit_task(task):
+    """Worker for the first pass of `normalize_clusters`, fits one cluster."""
+    return StreamingNormalizer().fit(_iter_cluster(task['file'], **task['reader']))
+
+def _transform_task(task):
+    """Worker for the second pass of `normalize_clusters`, writes one normalized cluster 
+    and returns its column sum."""
+    normed_frames = np.lib.format.open_memmap(task['output'], mode='w+', dtype=task['reader']['dtype'],
+                                              shape=task['shape'])
+    c_total = task['norm'].transform_chunks(_iter_cluster(task['file'], **task['reader']),
+                                            normed_frames, norm_type=task['norm_type'])
+    normed_frames.flush()
+    del normed_frames
+    return c_total
+
+def normalize_clusters(cluster_files, output_base_name='normed_clusttraj', prmtopFileName=None,
+                       atomSel=None, break_line=None, norm_type='v3', n_jobs=1, dtype=np.float32,
+                       return_c_total=False):
+    """Normalizes cluster files together in two passes over a pool of worker processes.
+
+    The first pass fits a `StreamingNormalizer` on each cluster and merges them into 
+    the global minimum, maximum and average. The second pass writes each normalized 
+    cluster to `{output_base_name}.c{i}.npy` through a memory map and sums its columns 
+    in the same pass. Each worker streams one cluster at a time, so no cluster needs 
+    to fit in memory.
+    
+    Parameters
+    ----------
+    cluster_files : list
+        The cluster files in order, trajectories readable by MDAnalysis 
+        (e.g. `clusttraj_*.dcd`) or cpptraj CRD/MDCRD files if `break_line` is given.
+    output_base_name : str, optional
+        The base name of the output files. Defaults to 'normed_clusttraj'.
+    prmtopFileName : str, optional
+        The file path of the topology file, for MDAnalysis trajectories.
+    atomSel : str, optional
+        The atom selection string, for MDAnalysis trajectories.
+    break_line : int, optional
+        The number of lines per frame, for CRD/MDCRD files.
+    norm_type : {'v2', 'v3'}, optional
+        The type of normalization. Defaults to 'v3'.
+    n_jobs : int, optional
+        The number of worker processes, -1 for all CPUs. Defaults to 1.
+    dtype : np.dtype, optional
+        The dtype of the normalized data. Defaults to np.float32.
+    return_c_total : bool, optional
+        Whether to also return the column sum of each normalized cluster. 
+        Defaults to False.
+    
+    Returns
+    -------
+    list
+        The paths of the normalized `.npy` files.
+    list of np.ndarray
+        The column sum of each normalized cluster, the esim `c_total`, if 
+        `return_c_total` is True.
+    
+    Examples
+    --------
+    >>> normed_files = normalize_clusters(sorted(glob.glob('clusttraj_*.dcd')), 
+                                          prmtopFileName='aligned_tau.pdb', 
+                                          atomSel='resid 3 to 12 and name N CA C O H', n_jobs=4)
+    """
+    n_jobs = os.cpu_count() if n_jobs == -1 else max(1, n_jobs)
+    reader = {'prmtopFileName': prmtopFileName, 'atomSel': atomSel, 'break_line': break_line,
+              'dtype': dtype}
+    fit_tasks = [{'file': file, 'reader': reader} for file in cluster_files]
+    executor = ProcessPoolExecutor(max_workers=n_jobs) if n_jobs > 1 else None
+    try:
+        map_tasks = executor.map if executor else map
+        cluster_norms = list(map_tasks(_fit_task, fit_tasks))
+        norm = StreamingNormalizer()
+        for cluster_norm in cluster_norms:
+            norm.merge(cluster_norm)
+        outputs = [f'{output_base_name}.c{i}.npy' for i in range(len(cluster_files))]
+        transform_tasks = [{'file': file, 'reader': reader, 'norm': norm, 'norm_type': norm_type,
+                            'output': output, 'shape': (cluster_norm.n_samples, len(norm.sum))}
+                           for file, output, cluster_norm in zip(cluster_files, outputs, cluster_norms)]
+        c_totals = list(map_tasks(_transform_task, transform_tasks))
+    finally:
+        if executor:
+            executor.shutdown()
+    if return_c_total:
+        return outputs, c_totals
+    return outputs
+
 def read_cpptraj(break_line=None, norm_type=None, min=None, max=None, avg=None, normalize=False):
     """Read multiple AMBER CRD files to convert to numpy ndarray formatting and normalize the data.
     
@@ -169,13 +694,7 @@ def read_cpptraj(break_line=None, norm_type=None, min=None, max=None, avg=None,
     frames_list = []
     count_frames = []
     for file in input_files:
-        with open(file, 'r') as infile:
-            lines = [line.rstrip() for line in infile][1:]
-        sep_lines = [[line[i:i+8] for i in range(0, len(line), 8)] for line in lines]
-        chunks = [sep_lines[i:i+break_line] for i in range(0, len(sep_lines), break_line)]
-        str_frames = [list(chain.from_iterable(chunk)) for chunk in chunks]
-        str_frames = [' '.join(frame) for frame in str_frames]
-        frames = np.array([np.fromstring(frame, dtype='float32', sep=' ') for frame in str_frames])
+        frames = read_crd(file, break_line)
         if normalize:
             norm = Normalizer(data=frames, custom_min=min, custom_max=max, custom_avg=avg)
             if norm_type == "v2":
@@ -221,14 +740,7 @@ def normalize_file(file, break_line=None, norm_type=None):
     if file is not isinstance(file, str):
         frames = file
     if break_line:
-        break_line = break_line
-        with open(file, 'r') as infile:
-            lines = [line.rstrip() for line in infile][1:]
-        sep_lines = [[line[i:i+8] for i in range(0, len(line), 8)] for line in lines]
-        chunks = [sep_lines[i:i+break_line] for i in range(0, len(sep_lines), break_line)]
-        str_frames = [list(chain.from_iterable(chunk)) for chunk in chunks]
-        str_frames = [' '.join(frame) for frame in str_frames]
-        frames = np.array([np.fromstring(frame, dtype='float32', sep=' ') for frame in str_frames])
+        frames = read_crd(file, break_line)
     if norm_type == "v2":
         norm = Normalizer(data=frames)
         normed_frame = norm.get_v2_norm()
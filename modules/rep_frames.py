@@ -1,34 +1,13 @@
 "This script aims to find the representative frame for each method below."""
-from modules.esim import calculate_medoid
-from modules.sim_calc import trim_outliers
+from modules.esim import calculate_medoid, calculate_comp_sim_array, BatchSimilarityIndex, _get_chunk_size
+from modules.sim_calc import trim_outliers, calculate_top_frames, load_sims
+from modules.cluster_store import ClusterStore
 import numpy as np
 import json
-import re
+import os
 
-def calculate_max_key(dict):
-    """Calculate the key with the maximum value in a dictionary.
-
-    Parameters
-    ----------
-    dict : dict
-        The dictionary to be searched.
-    
-    Returns
-    -------
-    max_key : int
-        The key with the maximum value.
-    """
-    max_val = float('-inf')
-    max_key = None
-    for k, v in dict.items():
-        for num in v:
-            if num > max_val:
-                max_val = num
-                max_key = k
-    max_key = int(re.findall(r'\d+', max_key)[0])
-    return max_key
-
-def gen_all_methods_max(sim_folder='nw', norm_folder='v3_norm', weighted_by_frames=True, trim_frac=0.1, n_ary='RR', weight='nw', output_name='rep'):
+def gen_all_methods_max(sim_folder='nw', norm_folder='v3_norm', weighted_by_frames=True, trim_frac=0.1, n_ary='RR', weight='nw', output_name='rep', 
+                        memory_budget=None):
     """Generate the representative frame for each method.
 
     Parameters
@@ -37,12 +16,17 @@ def gen_all_methods_max(sim_folder='nw', norm_folder='v3_norm', weighted_by_fram
         Similarity is weighted by frames. The default is True.
     trim_frac : float, optional
         The fraction of outliers to be trimmed. The default is 0.1.
-    n_ary : str, optional
-        The n-ary method. The default is 'RR'.
+    n_ary : {str, list}, optional
+        The n-ary method, or a list of n-ary methods whose medoids are calculated 
+        from the same counters, with one output file per method. The default is 'RR'.
     weight : str, optional
         The weight method. The default is 'nw'.
     output_name : str, optional
         The output name. The default is 'rep'.
+    memory_budget : int, optional
+        Maximum number of bytes per block for the medoid calculations. The clusters 
+        are read from a memory-mapped `ClusterStore`, so this bounds the memory used. 
+        The default is None.
     """
     if weighted_by_frames is True:
         w = "w_"
@@ -52,48 +36,59 @@ def gen_all_methods_max(sim_folder='nw', norm_folder='v3_norm', weighted_by_fram
         t = f"_t{int(float(trim_frac) * 100)}"
     elif not trim_frac:
         t= ""
-    with open(f"{sim_folder}/{w}{output_name}_{n_ary}{t}.txt","w") as output:
-        output.write("# Frame number with max values by method: medoid_all, medoid_c0, medoid_c0(trimmed), pairwise, union, medoid, outlier\n")
-        
-        # medoid_all
-        c_all = np.load(f"{norm_folder}/normed_data.npy")
-        output.write(f"{calculate_medoid(c_all, n_ary=n_ary, weight=weight)}, ")
-        
-        # medoid_c0 (untrimmed)
-        c0 = np.load(f"{norm_folder}/normed_clusttraj.c0.npy")
-        output.write(f"{calculate_medoid(c0, n_ary=n_ary, weight=weight)}, ")
-        
-        # medoid_c0 (trimmed)
-        if not trim_frac:
-            output.write(f"{calculate_medoid(c0, n_ary=n_ary, weight=weight)}, ")
-        elif trim_frac:
-            trim_c0 = trim_outliers(c0, trim_frac=trim_frac, n_ary=n_ary, weight=weight, removal='delete')
-            index = calculate_medoid(trim_c0)
-            search = trim_c0[index]
-            new_index = np.where((c0 == search).all(axis=1))[0]
-            output.write(f"{new_index[0]}, ")
-        
-        # pairwise
-        with open(f"{sim_folder}/{w}pairwise_{n_ary}{t}.txt", "r") as file:
-            pairwise = json.load(file)
-        output.write(f"{calculate_max_key(pairwise)}, ")
-
-        # union
-        with open(f"{sim_folder}/{w}union_{n_ary}{t}.txt", "r") as file:
-            union = json.load(file)
-        output.write(f"{calculate_max_key(union)}, ")
-
-        # medoid
-        with open(f"{sim_folder}/{w}medoid_{n_ary}{t}.txt", "r") as file:
-            medoid = json.load(file)
-        output.write(f"{calculate_max_key(medoid)}, ")
-        
-        # outlier
-        with open(f"{sim_folder}/{w}outlier_{n_ary}{t}.txt", "r") as file:
-            outlier = json.load(file)
-        output.write(f"{calculate_max_key(outlier)}")
-
-def gen_one_method_max(method, sim_folder='nw', norm_folder='v3_norm', weighted_by_frames=True, trim_frac=0.1, n_ary='RR', weight='nw', output_name='rep'):
+    indices = [n_ary] if isinstance(n_ary, str) else list(n_ary)
+
+    # medoid_all, the packed store holds all clusters in order
+    store = ClusterStore.from_folder(norm_folder)
+    medoid_all = calculate_medoid(store.data, n_ary=indices, weight=weight, memory_budget=memory_budget)
+    
+    # medoid_c0 (untrimmed), the complementary similarities also rank the c0 outliers to trim
+    c0 = store[0]
+    c0_comp_sims = calculate_comp_sim_array(c0, n_ary=indices, weight=weight, memory_budget=memory_budget)
+
+    for index in indices:
+        with open(f"{sim_folder}/{w}{output_name}_{index}{t}.txt","w") as output:
+            output.write("# Frame number with max values by method: medoid_all, medoid_c0, medoid_c0(trimmed), pairwise, union, medoid, outlier\n")
+            output.write(f"{medoid_all[index]}, ")
+            medoid_c0 = int(np.nanargmin(c0_comp_sims[index]))
+            output.write(f"{medoid_c0}, ")
+            
+            # medoid_c0 (trimmed)
+            if not trim_frac:
+                output.write(f"{medoid_c0}, ")
+            elif trim_frac:
+                output.write(f"{_trimmed_medoid_c0(c0, c0_comp_sims[index], trim_frac, memory_budget)}, ")
+            
+            # pairwise, union, medoid and outlier
+            maxes = [str(_read_max_frame(f"{sim_folder}/{w}{method}_{index}{t}")) 
+                     for method in ['pairwise', 'union', 'medoid', 'outlier']]
+            output.write(", ".join(maxes))
+
+def _read_top_frames(base_path, k=1):
+    """Returns the `k` frames with the maximum similarity of a similarity output and 
+    their scores, read from the `.npz` file if present and not older than the JSON 
+    `.txt` file."""
+    npz_path, txt_path = f"{base_path}.npz", f"{base_path}.txt"
+    if os.path.exists(npz_path) and (not os.path.exists(txt_path) 
+                                     or os.path.getmtime(npz_path) >= os.path.getmtime(txt_path)):
+        return calculate_top_frames(load_sims(npz_path), k=k)
+    with open(txt_path, "r") as file:
+        return calculate_top_frames(json.load(file), k=k)
+
+def _read_max_frame(base_path):
+    """Returns the frame with the maximum similarity of a similarity output."""
+    return int(_read_top_frames(base_path)[0][0])
+
+def _trimmed_medoid_c0(c0, comp_sims, trim_frac, memory_budget=None):
+    """Returns the frame of c0 that is the medoid of c0 without its `trim_frac` outliers."""
+    trim_c0 = trim_outliers(c0, trim_frac=trim_frac, removal='delete', comp_sims=comp_sims)
+    index = calculate_medoid(trim_c0, memory_budget=memory_budget)
+    search = trim_c0[index]
+    new_index = np.where((c0 == search).all(axis=1))[0]
+    return new_index[0]
+
+def gen_one_method_max(method, sim_folder='nw', norm_folder='v3_norm', weighted_by_frames=True, trim_frac=0.1, n_ary='RR', weight='nw', output_name='rep', 
+                       memory_budget=None, top_k=1):
     """Generate the representative frame for each method.
 
     Parameters
@@ -104,12 +99,21 @@ def gen_one_method_max(method, sim_folder='nw', norm_folder='v3_norm', weighted_
         Similarity is weighted by frames. The default is True.
     trim_frac : float, optional
         The fraction of outliers to be trimmed. The default is 0.1.
-    n_ary : str, optional
-        The n-ary method. The default is 'RR'.
+    n_ary : {str, list}, optional
+        The n-ary method, or a list of n-ary methods whose medoids are calculated 
+        from the same counters, with one output file per method. The default is 'RR'.
     weight : str, optional
         The weight method. The default is 'nw'.
     output_name : str, optional
         The output name. The default is 'rep'.
+    memory_budget : int, optional
+        Maximum number of bytes per block for the medoid calculations. The clusters 
+        are read from a memory-mapped `ClusterStore`, so this bounds the memory used. 
+        The default is None.
+    top_k : int, optional
+        For the 'pairwise', 'union', 'medoid' and 'outlier' methods, also write the 
+        `top_k` best frames and their scores to a `_top{top_k}.txt` file, read from 
+        the same similarity file. The default is 1, no extra file.
     
     Raises
     ------
@@ -127,31 +131,156 @@ def gen_one_method_max(method, sim_folder='nw', norm_folder='v3_norm', weighted_
         t = f"_t{int(float(trim_frac) * 100)}"
     elif not trim_frac:
         t= ""
+    if method == 'medoid_c0(trimmed)' and not trim_frac:
+        raise ValueError("No trimmed frac available")
+    indices = [n_ary] if isinstance(n_ary, str) else list(n_ary)
     
-    with open(f"{sim_folder}/{w}{output_name}_{n_ary}{t}_{method}.txt","w") as output:
-        output.write(f"# Frame number with max values by method: {method}\n")
-        
-        if method == 'medoid_all':
-            c_all = np.load(f"{norm_folder}/normed_data.npy")
-            output.write(f"{calculate_medoid(c_all, n_ary=n_ary, weight=weight)}")
-        
-        elif method == 'medoid_c0':
-            c0 = np.load(f"{norm_folder}/normed_clusttraj.c0")
-            output.write(f"{calculate_medoid(c0, n_ary=n_ary, weight=weight)}")
-        
-        elif method == 'medoid_c0(trimmed)':
-            if not trim_frac:
-                raise ValueError("No trimmed frac available")
-            elif trim_frac:
-                trim_c0 = trim_outliers(c0, trim_frac=trim_frac, n_ary=n_ary, weight=weight, removal='delete')
-                index = calculate_medoid(trim_c0)
-                search = trim_c0[index]
-                new_index = np.where((c0 == search).all(axis=1))[0]
-                output.write(f"{new_index[0]}")
-        
-        prime_methods = ['pairwise', 'union', 'medoid', 'outlier']
-
-        if method in prime_methods:
-            with open(f"{sim_folder}/{w}{method}_{n_ary}{t}.txt", "r") as file:
-                data = json.load(file)
-            output.write(f"{calculate_max_key(data)}")
\ No newline at end of file
+    if method == 'medoid_all':
+        store = ClusterStore.from_folder(norm_folder)
+        frames = calculate_medoid(store.data, n_ary=indices, weight=weight, memory_budget=memory_budget)
+    elif method in ['medoid_c0', 'medoid_c0(trimmed)']:
+        c0 = ClusterStore.from_folder(norm_folder)[0]
+        c0_comp_sims = calculate_comp_sim_array(c0, n_ary=indices, weight=weight, memory_budget=memory_budget)
+        if method == 'medoid_c0':
+            frames = {index: int(np.nanargmin(c0_comp_sims[index])) for index in indices}
+        else:
+            frames = {index: _trimmed_medoid_c0(c0, c0_comp_sims[index], trim_frac, memory_budget)
+                      for index in indices}
+    else:
+        frames = {}
+        for index in indices:
+            top_frames, scores = _read_top_frames(f"{sim_folder}/{w}{method}_{index}{t}", k=top_k)
+            frames[index] = int(top_frames[0])
+            if top_k > 1:
+                with open(f"{sim_folder}/{w}{output_name}_{index}{t}_{method}_top{top_k}.txt", "w") as output:
+                    output.write(f"# Top {top_k} frames and scores by method: {method}\n")
+                    for frame, score in zip(top_frames, scores):
+                        output.write(f"{frame} {score}\n")
+
+    for index in indices:
+        with open(f"{sim_folder}/{w}{output_name}_{index}{t}_{method}.txt","w") as output:
+            output.write(f"# Frame number with max values by method: {method}\n")
+            output.write(f"{frames[index]}")
+
+def calculate_window_rep_frames(data, width, step=None, method='medoid', n_ary='RR', weight='nw', 
+                                memory_budget=None, backend='numpy'):
+    """Calculate the representative frame of every window of a trajectory.
+
+    The column sum of each window is the difference of two cumulative column sums, 
+    so no window is summed from scratch. The windows are evaluated in blocks, with 
+    the complementary (or union) sums of all their frames in one vectorized pass.
+
+    Parameters
+    ----------
+    data : numpy.ndarray
+        The normalized frames of the trajectory, in time order. Can be memory-mapped.
+    width : int
+        The number of frames of each window, at least 2.
+    step : int, optional
+        The number of frames between the starts of consecutive windows. 
+        The default is None, non-overlapping windows.
+    method : {'medoid', 'outlier', 'union'}, optional
+        The representative frame of each window: 'medoid' minimizes the 
+        complementary similarity (as `calculate_medoid`), 'outlier' maximizes it 
+        and 'union' maximizes the similarity of the window united with the frame. 
+        The default is 'medoid'.
+    n_ary : {str, list}, optional
+        The n-ary method, or a list of n-ary methods evaluated from the same counters. 
+        The default is 'RR'.
+    weight : str, optional
+        The weight method. The default is 'nw'.
+    memory_budget : int, optional
+        Maximum number of bytes of temporaries per block of windows. The default is None.
+    backend : {'numpy', 'numba'}, optional
+        The backend of the esim counters. The default is 'numpy'.
+
+    Returns
+    -------
+    starts : numpy.ndarray
+        The first frame of each window.
+    frames : {numpy.ndarray, dict}
+        The representative frame of each window, as a frame of `data`. 
+        Keyed by index for a list of indices.
+
+    Raises
+    ------
+    ValueError
+        Invalid method or window width.
+    """
+    if method not in ['medoid', 'outlier', 'union']:
+        raise ValueError("Invalid method. Choose from 'medoid', 'outlier', 'union'")
+    n_frames, n_features = data.shape
+    if not 2 <= width <= n_frames:
+        raise ValueError(f"Window width must be between 2 and the number of frames ({n_frames})")
+    step = step or width
+    starts = np.arange(0, n_frames - width + 1, step)
+    indices = [n_ary] if isinstance(n_ary, str) else list(n_ary)
+    frames = {index: np.empty(len(starts), dtype=np.int64) for index in indices}
+
+    # The frames spanned by a block of windows are bounded by the budget as well as their sums
+    n_windows = max(1, _get_chunk_size(n_features, memory_budget=memory_budget) // max(width, step))
+    offsets = np.arange(width)
+    for i in range(0, len(starts), n_windows):
+        block = starts[i:i + n_windows]
+        first, last = block[0], block[-1] + width
+        # Cumulative column sums of the frames spanned by the block, with a leading zero row
+        span = np.asarray(data[first:last], dtype=np.float64)
+        cum_sums = np.zeros((len(span) + 1, n_features))
+        np.cumsum(span, axis=0, out=cum_sums[1:])
+        c_totals = cum_sums[block - first + width] - cum_sums[block - first]
+        window_frames = span[(block - first)[:, None] + offsets]
+        if method == 'union':
+            sums = c_totals[:, None, :] + window_frames
+            n_objects = width + 1
+        else:
+            sums = c_totals[:, None, :] - window_frames
+            n_objects = width - 1
+        sims = BatchSimilarityIndex(sums.reshape(-1, n_features), n_objects, n_ary=n_ary, weight=weight,
+                                    c_threshold=None, w_factor="fraction", backend=backend)()
+        sims = sims.reshape(len(block), width)
+        for index in indices:
+            index_sims = sims if isinstance(n_ary, str) else sims[index]
+            best = np.nanargmin(index_sims, axis=1) if method == 'medoid' else np.nanargmax(index_sims, axis=1)
+            frames[index][i:i + len(block)] = block + best
+    if isinstance(n_ary, str):
+        return starts, frames[n_ary]
+    return starts, frames
+
+def gen_window_rep_frames(traj_file, width, step=None, method='medoid', sim_folder='nw', n_ary='RR', weight='nw', 
+                          output_name='rep', memory_budget=None):
+    """Generate the representative frame of every window of a normalized trajectory.
+
+    Parameters
+    ----------
+    traj_file : str
+        The `.npy` file of the normalized trajectory, opened with memory mapping.
+    width : int
+        The number of frames of each window.
+    step : int, optional
+        The number of frames between the starts of consecutive windows. 
+        The default is None, non-overlapping windows.
+    method : {'medoid', 'outlier', 'union'}, optional
+        The representative frame of each window, see `calculate_window_rep_frames`. 
+        The default is 'medoid'.
+    sim_folder : str, optional
+        The folder the output files are written to. The default is 'nw'.
+    n_ary : {str, list}, optional
+        The n-ary method, or a list of n-ary methods, with one output file per method. 
+        The default is 'RR'.
+    weight : str, optional
+        The weight method. The default is 'nw'.
+    output_name : str, optional
+        The output name. The default is 'rep'.
+    memory_budget : int, optional
+        Maximum number of bytes of temporaries per block of windows. The default is None.
+    """
+    data = np.load(traj_file, mmap_mode='r')
+    starts, frames = calculate_window_rep_frames(data, width, step=step, method=method, n_ary=n_ary, 
+                                                 weight=weight, memory_budget=memory_budget)
+    if isinstance(n_ary, str):
+        frames = {n_ary: frames}
+    for index, index_frames in frames.items():
+        with open(f"{sim_folder}/{output_name}_{index}_{method}_window{width}.txt", "w") as output:
+            output.write(f"# Window start, frame number by method: {method}, width: {width}, step: {step or width}\n")
+            for start, frame in zip(starts, index_frames):
+                output.write(f"{start}, {frame}\n")
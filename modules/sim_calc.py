@@ -1,8 +1,13 @@
 from modules.esim import *
+from modules.esim import _get_chunk_size
+from modules.cluster_store import ClusterStore
+from modules.cache import StatsCache, content_hash
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 import numpy as np
-import re
 import json
-import glob
+import os
+import re
 
 class FrameSimilarity:
     """A class to calculate the similarity between clusters.
@@ -11,20 +16,37 @@ class FrameSimilarity:
     ----------
     c0 : numpy.ndarray
         The data for the top cluster.
-    input_files : list
-        A list of the cluster files.
+    store : ClusterStore
+        The packed, memory-mapped cluster files, cluster 0 is the top cluster.
     summary_file : str
         The path to the summary file.
+    trim_frac : float
+        The fraction of outliers trimmed from the top cluster.
     n_clusters : int
         The number of clusters to analyze.
     weighted_by_frames : bool
         Whether to weight similarity values by the number of frames.
-    n_ary : str
-        The similarity metric to use for comparing clusters.
+    n_ary : {str, list}
+        The similarity metric to use for comparing clusters, or a list of metrics 
+        all evaluated from the same counters.
     weight : str
         The weighting scheme to use for comparing clusters.
-    sims : dict
-        A dictionary to store the similarity values.
+    n_jobs : int
+        The number of worker processes.
+    backend : str
+        The backend of the esim counters, 'numpy' or 'numba'.
+    cache : StatsCache
+        The on-disk cache of the cluster statistics, None if not cached.
+    return_dict : bool
+        Whether the methods return the legacy dictionaries instead of arrays.
+    sims : numpy.ndarray
+        The unweighted similarity of each c0 frame (rows) to each cluster (columns) 
+        from the last method called, a dictionary of arrays keyed by index for a list of indices.
+    trimmed : dict
+        For a list of indices or bit-packed frames with `trim_frac`, the c0 frames 
+        trimmed by each index.
+    packed : bool
+        Whether the frames are bit-packed binary objects, see `esim.pack_fingerprints`.
     
     Methods
     -------
@@ -36,10 +58,17 @@ class FrameSimilarity:
         Calculates the pairwise similarity between every frame in c0 and the medoid of each cluster.
     calculate_outlier()
         Calculates the pairwise similarity between every frame in c0 and the outlier of each cluster.
+    calculate_all()
+        Calculates all four methods and the representative frames in a single pass over the clusters.
+    calculate_trim_sweep(trim_fracs)
+        Calculates the methods and representative frames for several trim fractions in a single pass.
+    calculate_cluster_sweep(n_clusters)
+        Calculates the average similarity and representative frames for several numbers of clusters.
     """
     
     def __init__(self, cluster_folder=None, summary_file=None, trim_frac=None, n_clusters=None, 
-                 weighted_by_frames=True, n_ary='RR', weight='nw'):
+                 weighted_by_frames=True, n_ary='RR', weight='nw', n_jobs=1, backend='numpy',
+                 cache_dir=None, return_dict=False, memory_budget=None, packed=False):
         """Initializes instances for the FrameSimilarity class.
         
         Parameters
@@ -54,61 +83,257 @@ class FrameSimilarity:
             The number of clusters to analyze, None for all clusters.
         weighted_by_frames : bool
             Whether to weight similarity values by the number of frames.
-        n_ary : str
-            The similarity metric to use for comparing clusters.
+        n_ary : {str, list}
+            The similarity metric to use for comparing clusters. With a list of metrics 
+            (e.g. `esim.INDICES`) every method returns a dictionary keyed by index, and 
+            all indices are evaluated from the same counters in a single run.
         weight : str
             The weighting scheme to use for comparing clusters.
+        n_jobs : int
+            The number of worker processes, -1 for all CPUs. The default is 1.
+        backend : {'numpy', 'numba'}
+            The backend of the esim counters, 'numba' falls back to 'numpy' if 
+            numba is not installed. The default is 'numpy'.
+        cache_dir : str, optional
+            The folder of a persistent `StatsCache` for the cluster statistics. 
+            The default is None, no cache.
+        return_dict : bool, optional
+            Whether the methods return the legacy dictionaries keyed by `f{frame}` 
+            (see `sims_to_dict`) instead of arrays. The default is False.
+        memory_budget : int, optional
+            Maximum number of bytes of temporaries per block of the pairwise and 
+            union methods. Pairwise is always calculated in tiles of c0 and ck frames 
+            whose similarities are summed per c0 frame, so the c0 x ck matrix is 
+            never held in memory. The default is None, about 2**22 elements per tile.
+        packed : bool, optional
+            Whether to bit-pack the frames, for clusters of binary objects (e.g. 
+            thresholded contact maps). c0 and each compared cluster are held 1 bit 
+            per feature and the frame pairs are compared with popcounts. The 
+            default is False.
         
         Notes
         -----
-        - For each cluster file, loads the data and calculates the similarity score 
-        with the top (c0) cluster.
-        - The esim index used is defined by the `n_ary` parameter.
+        - The cluster files are packed into a `ClusterStore` the first time, each 
+        cluster is then sliced from the memory-mapped store and compared with the 
+        top (c0) cluster.
+        - The column sum, medoid and outlier of each cluster are calculated once 
+        and shared by all methods called on the instance.
+        - With `n_jobs` > 1 the clusters (and blocks of c0 frames for pairwise) are 
+        distributed across a process pool. c0 is placed in shared memory and the 
+        workers open the store themselves, so no frames are pickled.
+        - With `cache_dir` the cluster statistics, the trimmed c0 medoid and the 
+        medoid of all frames are saved on disk, keyed by the content hash of the 
+        clusters and the index parameters, and reused by later runs on the same data.
+        - The esim index used is defined by the `n_ary` parameter. With a list of 
+        indices, c0 is not trimmed in place since each index trims different frames, 
+        the frames trimmed by each index are set to NaN in its results instead.
         """
-        self.c0 = np.load(f"{cluster_folder}/normed_clusttraj.c0.npy")
-        if trim_frac:
-            self.c0 = trim_outliers(self.c0, trim_frac=trim_frac, n_ary=n_ary, weight=weight)
-        self.input_files = sorted(glob.glob(f"{cluster_folder}/normed_clusttraj.c*"), 
-                                  key=lambda x: int(re.findall("\d+", x)[0]))[1:]
+        self.store = ClusterStore.from_folder(cluster_folder)
         self.summary_file = summary_file
+        self.trim_frac = trim_frac
         self.n_clusters = n_clusters
         self.weighted_by_frames = weighted_by_frames
         self.n_ary = n_ary
         self.weight = weight
-        self.sims = {}
+        self.n_jobs = os.cpu_count() if n_jobs == -1 else max(1, n_jobs)
+        self.backend = backend
+        self.cache = StatsCache(cache_dir) if cache_dir else None
+        self.return_dict = return_dict
+        self.memory_budget = memory_budget
+        self.packed = packed
+        self.sims = None
+        self._stats = {}
+        self._hashes = {}
+        self.c0 = pack_fingerprints(self.store[0]) if packed else np.array(self.store[0])
+        self.trimmed = {}
+        if trim_frac:
+            comp_sims = self._cluster_stats(0)['comp_sims']
+            if isinstance(n_ary, str) and packed:
+                # Packed frames cannot hold NaN, the trimmed rows are set to NaN in the results
+                self.trimmed = {n_ary: _trimmed_rows(comp_sims, trim_frac)}
+            elif isinstance(n_ary, str):
+                self.c0 = trim_outliers(self.c0, trim_frac=trim_frac, n_ary=n_ary, weight=weight,
+                                        comp_sims=comp_sims)
+            else:
+                self.trimmed = {name: _trimmed_rows(comp_sims[name], trim_frac) for name in n_ary}
     
+    def _cluster_stats(self, k, ck=None):
+        """Calculates the column sum, complementary similarities, medoid and outlier 
+        of cluster `k` once and caches them.
+
+        Parameters
+        ----------
+        k : int
+            The cluster number.
+        ck : numpy.ndarray, optional
+            The frames of cluster `k`, sliced from the store if not given.
+
+        Returns
+        -------
+        dict
+            The `c_total`, `n_frames`, `comp_sims`, `medoid` and `outlier` of the cluster.
+        """
+        if k not in self._stats:
+            self._load_cached_stats(k)
+        if k not in self._stats:
+            if ck is None:
+                ck = self.store[k]
+            self._save_stats(k, _calculate_stats(ck, self.n_ary, self.weight, self.backend))
+        return self._stats[k]
+
+    def _cache_key(self, name, clusters, *params):
+        """Returns the cache key of an artifact of `clusters` calculated with the 
+        index parameters of the instance and `params`."""
+        for k in clusters:
+            if k not in self._hashes:
+                self._hashes[k] = content_hash(self.store[k])
+        return self.cache.key(name, [self._hashes[k] for k in clusters], self.n_ary, self.weight, 
+                              "fraction", *params)
+
+    def _load_cached_stats(self, k):
+        """Loads the statistics of cluster `k` from the cache if present."""
+        if self.cache is None:
+            return
+        entry = self.cache.get(self._cache_key('stats', [k]))
+        if entry is not None:
+            self._stats[k] = _stats_from_comp_sims(entry['c_total'], int(entry['n_frames']), 
+                                                   entry['comp_sims'])
+
+    def _save_stats(self, k, stats):
+        """Keeps the statistics of cluster `k` and saves them to the cache."""
+        self._stats[k] = stats
+        if self.cache is not None:
+            self.cache.put(self._cache_key('stats', [k]), 
+                           {key: stats[key] for key in ('c_total', 'n_frames', 'comp_sims')})
+
+    def _calculate_sims(self, methods):
+        """Calculates the similarity of each c0 frame with every cluster for `methods`.
+
+        Parameters
+        ----------
+        methods : list
+            The methods to calculate, from 'pairwise', 'union', 'medoid' and 'outlier'.
+
+        Returns
+        -------
+        dict
+            For each method, the similarity vectors keyed by cluster number starting at 0 for c1.
+        """
+        sims = {method: {} for method in methods}
+        if self.n_jobs == 1:
+            for each, ck in enumerate(self.store[1:]):
+                ck = pack_fingerprints(ck) if self.packed else np.asarray(ck)
+                stats = None
+                if set(methods) - {'pairwise'}:
+                    stats = self._cluster_stats(each + 1, ck)
+                for method, values in _cluster_sims(self.c0, ck, stats, methods, self.n_ary, self.weight, 
+                                                    self.backend, self.memory_budget).items():
+                    sims[method][each] = values
+            return sims
+
+        # Pairwise alone is split in blocks of c0 frames, the other methods need whole clusters
+        if set(methods) == {'pairwise'}:
+            block = -(-len(self.c0) // self.n_jobs)
+            row_blocks = [(start, min(start + block, len(self.c0))) for start in range(0, len(self.c0), block)]
+        else:
+            row_blocks = [(0, len(self.c0))]
+        if set(methods) - {'pairwise'}:
+            for k in range(1, len(self.store)):
+                if k not in self._stats:
+                    self._load_cached_stats(k)
+        # Packed frames are shared as their bits and wrapped again by the workers
+        c0_array = self.c0.bits if self.packed else self.c0
+        shm = shared_memory.SharedMemory(create=True, size=max(1, c0_array.nbytes))
+        try:
+            c0 = np.ndarray(c0_array.shape, dtype=c0_array.dtype, buffer=shm.buf)
+            c0[:] = c0_array
+            del c0
+            tasks = [{'k': k, 'rows': rows, 'methods': methods, 'stats': self._stats.get(k),
+                      'c0_name': shm.name, 'c0_shape': c0_array.shape, 'c0_dtype': c0_array.dtype.str, 
+                      'n_features': self.c0.n_features if self.packed else None, 
+                      'folder': self.store.folder, 'n_ary': self.n_ary, 'weight': self.weight,
+                      'backend': self.backend, 'memory_budget': self.memory_budget}
+                     for k in range(1, len(self.store)) for rows in row_blocks]
+            with ProcessPoolExecutor(max_workers=self.n_jobs) as executor:
+                for task, (stats, values) in zip(tasks, executor.map(_cluster_task, tasks)):
+                    if stats is not None and task['k'] not in self._stats:
+                        self._save_stats(task['k'], stats)
+                    for method in methods:
+                        sims[method].setdefault(task['k'] - 1, []).append(values[method])
+        finally:
+            shm.close()
+            shm.unlink()
+        return {method: {each: np.concatenate(blocks) for each, blocks in sorted(sims[method].items())}
+                for method in methods}
+
+    def _format_sims(self, sims):
+        """Stacks the per-cluster similarity vectors into a frames x clusters array, 
+        weights them if requested and appends their average as the last column.
+
+        Parameters
+        ----------
+        sims : dict
+            The similarity of each c0 frame, keyed by cluster number starting at 0 for c1.
+
+        Returns
+        -------
+        numpy.ndarray
+            The similarity of each c0 frame (rows) to each cluster, weighted by 
+            `weight_sims` if `weighted_by_frames` is True, with the average 
+            similarity of the frame as the last column. The legacy dictionary 
+            from `sims_to_dict` if `return_dict` is True.
+        """
+        self.sims = np.column_stack([sims[each] for each in sorted(sims)])
+        values = self.sims
+        if self.weighted_by_frames:
+            values = weight_sims(values, self.summary_file, n_clusters=self.n_clusters)
+        values = np.column_stack([values, np.mean(values, axis=1)])
+        if self.return_dict:
+            return sims_to_dict(values)
+        return values
+
+    def _format_results(self, sims):
+        """Formats the similarity vectors of one method, for each index of a list of indices.
+
+        Parameters
+        ----------
+        sims : dict
+            The similarity of each c0 frame, keyed by cluster number starting at 0 for c1.
+
+        Returns
+        -------
+        dict
+            The output of `_format_sims`, keyed by index for a list of indices.
+        """
+        if isinstance(self.n_ary, str) and self.n_ary in self.trimmed:
+            sims = {each: values.copy() for each, values in sims.items()}
+            for values in sims.values():
+                values[self.trimmed[self.n_ary]] = np.nan
+        if isinstance(self.n_ary, str):
+            return self._format_sims(sims)
+        results = {}
+        all_sims = {}
+        for name in self.n_ary:
+            index_sims = {}
+            for each, values in sims.items():
+                index_sims[each] = values[name].copy()
+                index_sims[each][self.trimmed.get(name, [])] = np.nan
+            results[name] = self._format_sims(index_sims)
+            all_sims[name] = self.sims
+        self.sims = all_sims
+        return results
+
     def calculate_pairwise(self):
         """The similarity score is calculated as the average of pairwise similarity 
         values between each frame in the cluster and the top c0 cluster.
         
         Returns
         -------
-        If `frame_weighted_sim` returns `False`, 
-            nw_dict (dict): unweighted average similarity values.
-        If `frame_weighted_sim` returns `True`,
-            w_dict (dict): calls `weight_dict` function to weight similarity values.
+        numpy.ndarray
+            The similarity of each c0 frame to each cluster, with the average as the 
+            last column (see `_format_sims`), keyed by index for a list of indices.
         """
-        for each, file in enumerate(self.input_files):
-            ck = np.load(file)
-            self.sims[each] = {}
-            for i, x in enumerate(self.c0):
-                total = 0
-                for j, y in enumerate(ck):
-                    c_total = np.sum(np.array([x, y]), axis=0)
-                    pair_sim = SimilarityIndex(c_total, 2, n_ary=self.n_ary, weight=self.weight, 
-                                               c_threshold=None, w_factor="fraction")()
-                    total += pair_sim
-                avg = total / len(ck)
-                if f"f{i}" not in self.sims[each]:
-                    self.sims[each][f"f{i}"] = []
-                self.sims[each][f"f{i}"] = avg
-
-        nw_dict = _format_dict(self.sims)
-        if not self.weighted_by_frames:
-            return nw_dict
-        elif self.weighted_by_frames:
-            return weight_dict(file_path=None, summary_file=self.summary_file, dict=nw_dict, 
-                               n_clusters=self.n_clusters)
+        return self._format_results(self._calculate_sims(['pairwise'])['pairwise'])
 
     def calculate_union(self):
         """The similarity score is calculated as the union similarity between 
@@ -116,56 +341,27 @@ class FrameSimilarity:
         
         Returns
         -------
-        If `frame_weighted_sim` returns `False`, 
-            nw_dict (dict): unweighted average similarity values.
-        If `frame_weighted_sim` returns `True`,
-            w_dict (dict): calls `weight_dict` function to weight similarity values.
+        numpy.ndarray
+            The similarity of each c0 frame to each cluster, with the average as the 
+            last column (see `_format_sims`), keyed by index for a list of indices.
         """
-        for each, file in enumerate(self.input_files):
-            ck = np.load(file)
-            self.sims[each] = {}
-            for i, x in enumerate(self.c0):
-                c_total = np.sum(ck, axis=0) + x
-                n_fingerprints = len(ck) + 1
-                index = SimilarityIndex(c_total, n_fingerprints, n_ary=self.n_ary, weight=self.weight,
-                                        c_threshold=None, w_factor="fraction")()
-                if f"f{i}" not in self.sims[each]:
-                    self.sims[each][f"f{i}"] = []
-                self.sims[each][f"f{i}"] = index
-        
-        nw_dict = _format_dict(self.sims)
-        if not self.weighted_by_frames:
-            return nw_dict
-        elif self.weighted_by_frames:
-            return weight_dict(file_path=None, summary_file=self.summary_file, dict=nw_dict, 
-                               n_clusters=self.n_clusters)
-
-    def _perform_calculation(self, index_func):
+        return self._format_results(self._calculate_sims(['union'])['union'])
+
+    def _perform_calculation(self, key):
         """Auxillary function for `calculate_medoid` and `calculate_outlier`.
 
         Parameters
         ----------
-        index_func : function
-            The function to calculate the medoid or outlier of each cluster.
+        key : {'medoid', 'outlier'}
+            The frame of each cluster to compare with.
         
         Returns
         -------
-        nw_dict (dict): unweighted average similarity values.
+        numpy.ndarray
+            The similarity of each c0 frame to each cluster, with the average as the 
+            last column (see `_format_sims`), keyed by index for a list of indices.
         """
-        for each, file in enumerate(self.input_files):
-            ck = np.load(file)
-            index = index_func(ck, n_ary=self.n_ary, weight=self.weight)
-            medoid = ck[index]
-            self.sims[each] = {}
-            for i, x in enumerate(self.c0):
-                c_total = medoid + x
-                if f"f{i}" not in self.sims[each]:
-                    self.sims[each][f"f{i}"] = []
-                pair_sim = SimilarityIndex(c_total, 2, n_ary=self.n_ary, weight=self.weight,
-                                           c_threshold=None, w_factor="fraction")()
-                self.sims[each][f"f{i}"] = pair_sim
-        nw_dict = _format_dict(self.sims)
-        return nw_dict
+        return self._format_results(self._calculate_sims([key])[key])
     
     def calculate_medoid(self):
         """The pairwise similarity value between each frame in c0 and the medoid of each cluster 
@@ -173,17 +369,11 @@ class FrameSimilarity:
         
         Returns
         -------
-        If `frame_weighted_sim` returns `False`, 
-            nw_dict (dict): unweighted average similarity values.
-        If `frame_weighted_sim` returns `True`,
-            w_dict (dict): calls `weight_dict` function to weight similarity values.
+        numpy.ndarray
+            The similarity of each c0 frame to each cluster, with the average as the 
+            last column (see `_format_sims`), keyed by index for a list of indices.
         """
-        nw_dict = self._perform_calculation(calculate_medoid)
-        if not self.weighted_by_frames:
-            return nw_dict
-        elif self.weighted_by_frames:
-            return weight_dict(file_path=None, summary_file=self.summary_file, dict=nw_dict, 
-                               n_clusters=self.n_clusters)
+        return self._perform_calculation('medoid')
         
     def calculate_outlier(self):
         """The pairwise similarity value between each frame in c0 and the outlier of each cluster 
@@ -191,19 +381,603 @@ class FrameSimilarity:
         
         Returns
         -------
-        If `frame_weighted_sim` returns `False`, 
-            nw_dict (dict): unweighted average similarity values.
-        If `frame_weighted_sim` returns `True`,
-            w_dict (dict): calls `weight_dict` function to weight similarity values.
+        numpy.ndarray
+            The similarity of each c0 frame to each cluster, with the average as the 
+            last column (see `_format_sims`), keyed by index for a list of indices.
+        """
+        return self._perform_calculation('outlier')
+
+    def calculate_all(self):
+        """Calculates the pairwise, union, medoid and outlier methods and the 
+        representative frames in a single pass over the clusters.
+
+        Each cluster is read from the store once, and its column sum, medoid and 
+        outlier are calculated once and shared by all methods.
+
+        Returns
+        -------
+        results : dict
+            The output of each `calculate_{method}`, keyed by method.
+        rep_frames : dict
+            The representative frame of each method, keyed by 'medoid_all', 'medoid_c0', 
+            'medoid_c0(trimmed)', 'pairwise', 'union', 'medoid' and 'outlier'.
+            For a list of indices, the representative frames are keyed by index first.
+        """
+        methods = ['pairwise', 'union', 'medoid', 'outlier']
+        sims = self._calculate_sims(methods)
+        results = {method: self._format_results(sims[method]) for method in methods}
+        
+        return results, self._rep_frames(results, self._medoid_all(), self._trimmed_medoid)
+
+    def calculate_trim_sweep(self, trim_fracs, methods=None):
+        """Calculates the methods and the representative frames for several trim 
+        fractions in a single pass over the clusters.
+
+        c0 is ranked once by complementary similarity, and each fraction trims the 
+        first frames of that ranking. The similarities are calculated once without 
+        trimming and the trimmed frames are set to NaN for each fraction. The column 
+        sum of the trimmed c0 is updated by removing the ranked frames incrementally, 
+        so the trimmed medoid needs no new column sum.
+
+        Parameters
+        ----------
+        trim_fracs : list
+            The fractions of outliers to trim from the top cluster, e.g. [0, 0.05, 0.1].
+        methods : list, optional
+            The methods to calculate, from 'pairwise', 'union', 'medoid' and 'outlier'. 
+            The default is None, all four.
+
+        Returns
+        -------
+        results : dict
+            For each trim fraction, the output of each `calculate_{method}`, keyed by method.
+        rep_frames : dict
+            For each trim fraction, the representative frames as in `calculate_all`, 
+            for `methods` and 'medoid_all', 'medoid_c0' and 'medoid_c0(trimmed)'.
+
+        Raises
+        ------
+        ValueError
+            If the instance was created with a `trim_frac`.
+        """
+        if self.trim_frac:
+            raise ValueError("Create the FrameSimilarity without trim_frac to sweep trim fractions")
+        methods = methods or ['pairwise', 'union', 'medoid', 'outlier']
+        sims = self._calculate_sims(methods)
+        stats = self._cluster_stats(0)
+        medoid_all = self._medoid_all()
+        names = [self.n_ary] if isinstance(self.n_ary, str) else self.n_ary
+
+        # One ranking per index, and the column sum of the frames removed by each cutoff
+        comp_sims, rankings, removed_sums = {}, {}, {}
+        cutoffs = sorted({int(np.floor(len(self.c0) * float(frac or 0))) for frac in trim_fracs})
+        for name in names:
+            comp_sims[name] = stats['comp_sims'] if isinstance(self.n_ary, str) else stats['comp_sims'][name]
+            rankings[name] = _trim_ranking(comp_sims[name])
+            removed_sums[name] = _ranked_sums(self.c0, rankings[name], cutoffs, self.memory_budget)
+
+        def trimmed_medoid(name, medoid_c0):
+            trimmed = self.trimmed[name]
+            if len(trimmed) == 0:
+                return medoid_c0
+            kept = np.sort(rankings[name][len(trimmed):])
+            c_total = stats['c_total'] - removed_sums[name][len(trimmed)]
+            return int(kept[calculate_medoid(self.c0[kept], n_ary=name, weight=self.weight, 
+                                             c_total=c_total, backend=self.backend)])
+
+        results, rep_frames = {}, {}
+        try:
+            for trim_frac in trim_fracs:
+                self.trimmed = {name: _trimmed_rows(comp_sims[name], trim_frac, rankings[name]) 
+                                for name in names}
+                results[trim_frac] = {method: self._format_results(sims[method]) for method in methods}
+                rep_frames[trim_frac] = self._rep_frames(results[trim_frac], medoid_all, trimmed_medoid)
+        finally:
+            self.trimmed = {}
+        return results, rep_frames
+
+    def calculate_cluster_sweep(self, n_clusters, methods=None):
+        """Calculates the methods once and derives the average similarity and the 
+        representative frame for several numbers of clusters, see `sweep_n_clusters`.
+
+        Parameters
+        ----------
+        n_clusters : list
+            The numbers of clusters, counting c0, e.g. [5, 10, 15, 20]. The instance 
+            should be created with `n_clusters` None or at least the largest of them.
+        methods : list, optional
+            The methods to calculate, from 'pairwise', 'union', 'medoid' and 'outlier'. 
+            The default is None, all four.
+
+        Returns
+        -------
+        averages : dict
+            For each method, the average similarity of each c0 frame (rows) for each 
+            number of clusters (columns), keyed by index for a list of indices.
+        rep_frames : dict
+            For each method, the representative frame of each number of clusters, 
+            keyed by index for a list of indices.
+        """
+        methods = methods or ['pairwise', 'union', 'medoid', 'outlier']
+        sims = self._calculate_sims(methods)
+        averages, rep_frames = {}, {}
+        for method in methods:
+            stacked = np.column_stack([sims[method][each] for each in sorted(sims[method])])
+            if isinstance(self.n_ary, str):
+                if self.n_ary in self.trimmed:
+                    stacked = stacked.copy()
+                    stacked[self.trimmed[self.n_ary]] = np.nan
+                averages[method], frames = sweep_n_clusters(stacked, self.summary_file, n_clusters, 
+                                                            self.weighted_by_frames)
+                rep_frames[method] = dict(zip(n_clusters, frames.tolist()))
+                continue
+            averages[method], rep_frames[method] = {}, {}
+            for name in self.n_ary:
+                index_sims = stacked[name].copy()
+                index_sims[self.trimmed.get(name, [])] = np.nan
+                averages[method][name], frames = sweep_n_clusters(index_sims, self.summary_file, n_clusters,
+                                                                  self.weighted_by_frames)
+                rep_frames[method][name] = dict(zip(n_clusters, frames.tolist()))
+        return averages, rep_frames
+
+    def _medoid_all(self):
+        """Returns the medoid of all frames, from the sum of the cluster column sums."""
+        c_total_all = sum(self._cluster_stats(k)['c_total'] for k in range(len(self.store)))
+        return self._cached_frame('medoid_all', range(len(self.store)), (), 
+                                  lambda: calculate_medoid(self.store.data, n_ary=self.n_ary, 
+                                                           weight=self.weight, c_total=c_total_all, 
+                                                           backend=self.backend))
+
+    def _rep_frames(self, results, medoid_all, trimmed_medoid):
+        """Returns the representative frames of `results` and of the c0 medoids, 
+        keyed by index first for a list of indices. `trimmed_medoid(name, medoid_c0)` 
+        returns the medoid of the trimmed c0 for index `name`."""
+        medoid_c0 = self._cluster_stats(0)['medoid']
+        if isinstance(self.n_ary, str):
+            rep_frames = {'medoid_all': medoid_all, 'medoid_c0': medoid_c0,
+                          'medoid_c0(trimmed)': trimmed_medoid(self.n_ary, medoid_c0)}
+            for method in results:
+                rep_frames[method] = calculate_max_frame(results[method])
+            return rep_frames
+
+        rep_frames = {}
+        for name in self.n_ary:
+            rep_frames[name] = {'medoid_all': medoid_all[name], 'medoid_c0': medoid_c0[name],
+                                'medoid_c0(trimmed)': trimmed_medoid(name, medoid_c0[name])}
+            for method in results:
+                rep_frames[name][method] = calculate_max_frame(results[method][name])
+        return rep_frames
+
+    def _trimmed_medoid(self, name, medoid_c0):
+        """Returns the medoid of c0 without the frames trimmed by index `name`, 
+        `medoid_c0` if nothing is trimmed."""
+        if not self.trim_frac:
+            return medoid_c0
+        if name in self.trimmed:
+            kept = np.setdiff1d(np.arange(len(self.c0)), self.trimmed[name])
+        else:
+            kept = np.flatnonzero(~np.isnan(self.c0).any(axis=1))
+        return self._cached_frame('medoid_c0(trimmed)', [0], (name, self.trim_frac, kept.tolist()), 
+                                  lambda: int(kept[calculate_medoid(self.c0[kept], n_ary=name, 
+                                                                    weight=self.weight, 
+                                                                    backend=self.backend)]))
+
+    def _cached_frame(self, name, clusters, params, func):
+        """Returns a representative frame from the cache, or calculates it with `func` 
+        and saves it if not cached."""
+        if self.cache is None:
+            return func()
+        key = self._cache_key(name, list(clusters), *params)
+        entry = self.cache.get(key)
+        if entry is not None:
+            if 'frame' in entry:
+                return int(entry['frame'])
+            return {index: int(entry[index]) for index in entry}
+        frame = func()
+        self.cache.put(key, frame if isinstance(frame, dict) else {'frame': frame})
+        return frame
+
+class OnlineFrameSimilarity:
+    """A class to update the PRIME similarities as frames are appended to the clusters.
+
+    Every extended similarity depends on additive column sums and frame counts, 
+    so appended frames only require the new comparisons: the union column of a 
+    cluster is recalculated from its updated column sum, the pairwise sums only 
+    add the new pairs of frames, and the medoid and outlier of a cluster are 
+    recalculated lazily, when a result is requested after the cluster changed.
+    Nothing is read back from the cluster files.
+
+    Attributes
+    ----------
+    n_ary : str
+        The similarity metric to use for comparing clusters.
+    weight : str
+        The weighting scheme to use for comparing clusters.
+    weighted_by_frames : bool
+        Whether to weight similarity values by the current number of frames of each cluster.
+    backend : str
+        The backend of the esim counters, 'numpy' or 'numba'.
+    memory_budget : int
+        Maximum number of bytes of temporaries per block, None for the default blocks.
+    n_frames : list
+        The number of frames of each cluster.
+    c_totals : list
+        The column sum of each cluster.
+
+    Methods
+    -------
+    from_folder(cluster_folder, n_clusters, **kwargs)
+        Starts from the clusters of a folder.
+    append(k, frames)
+        Appends frames to cluster `k`, or adds a new cluster.
+    calculate_pairwise()
+        Returns the current pairwise similarities.
+    calculate_union()
+        Returns the current union similarities.
+    calculate_medoid()
+        Returns the current similarities to the medoid of each cluster.
+    calculate_outlier()
+        Returns the current similarities to the outlier of each cluster.
+    calculate_rep_frames(methods)
+        Returns the current representative frame of each method.
+    """
+    methods = ('pairwise', 'union', 'medoid', 'outlier')
+
+    def __init__(self, n_ary='RR', weight='nw', weighted_by_frames=True, backend='numpy', memory_budget=None):
+        """Initializes instances for the OnlineFrameSimilarity class.
+
+        Parameters
+        ----------
+        n_ary : str, optional
+            The similarity metric to use for comparing clusters. The default is 'RR'.
+        weight : str, optional
+            The weighting scheme to use for comparing clusters. The default is 'nw'.
+        weighted_by_frames : bool, optional
+            Whether to weight similarity values by the current number of frames 
+            of each cluster. The default is True.
+        backend : {'numpy', 'numba'}, optional
+            The backend of the esim counters. The default is 'numpy'.
+        memory_budget : int, optional
+            Maximum number of bytes of temporaries per block. The default is None.
+
+        Raises
+        ------
+        ValueError
+            If `n_ary` is not a single index.
+
+        Notes
+        -----
+        - The appended frames must be normalized like the existing ones, e.g. with 
+        `StreamingNormalizer.transform` and a fixed `custom_min` and `custom_max`.
+        - The results match `FrameSimilarity` on the same frames without trimming, 
+        with the clusters weighted by their current number of frames instead of 
+        the summary file.
+        """
+        if not isinstance(n_ary, str):
+            raise ValueError("OnlineFrameSimilarity calculates a single index, got a list")
+        self.n_ary = n_ary
+        self.weight = weight
+        self.weighted_by_frames = weighted_by_frames
+        self.backend = backend
+        self.memory_budget = memory_budget
+        self.n_frames = []
+        self.c_totals = []
+        self._data = []
+        self._stats = {}
+        self._cols = {method: {} for method in self.methods}
+        self._done = {method: {} for method in self.methods}
+
+    @classmethod
+    def from_folder(cls, cluster_folder, n_clusters=None, **kwargs):
+        """Starts from the normalized clusters of a folder.
+
+        Parameters
+        ----------
+        cluster_folder : str
+            The path to the folder containing the normalized cluster files.
+        n_clusters : int, optional
+            The number of clusters to load, None for all clusters.
+        **kwargs
+            The parameters of `OnlineFrameSimilarity`.
+
+        Returns
+        -------
+        OnlineFrameSimilarity
+            The instance with the frames of every cluster appended.
+        """
+        online = cls(**kwargs)
+        for k, ck in enumerate(ClusterStore.from_folder(cluster_folder)[:n_clusters]):
+            online.append(k, ck)
+        return online
+
+    @property
+    def n_clusters(self):
+        """Returns the number of clusters."""
+        return len(self._data)
+
+    def cluster(self, k):
+        """Returns the frames of cluster `k`."""
+        return self._data[k][:self.n_frames[k]]
+
+    def append(self, k, frames):
+        """Appends normalized frames to cluster `k` and updates its column sum.
+
+        Parameters
+        ----------
+        k : int
+            The cluster number, 0 for the top cluster, `n_clusters` to add a new cluster.
+        frames : array_like
+            The normalized frames, of shape (n_frames, n_features).
+
+        Raises
+        ------
+        IndexError
+            If `k` is not an existing cluster or the next one.
+        ValueError
+            If the frames do not have the number of features of the clusters.
+        """
+        frames = np.asarray(frames)
+        if frames.ndim == 1:
+            frames = frames[None, :]
+        if not 0 <= k <= self.n_clusters:
+            raise IndexError(f"Cluster {k} out of range for {self.n_clusters} clusters")
+        if self._data and frames.shape[1] != self._data[0].shape[1]:
+            raise ValueError("Dimensions of the frames and the clusters differ")
+        if k == self.n_clusters:
+            self._data.append(np.empty((max(16, len(frames)), frames.shape[1]), dtype=frames.dtype))
+            self.n_frames.append(0)
+            self.c_totals.append(np.zeros(frames.shape[1]))
+        n = self.n_frames[k]
+        if n + len(frames) > len(self._data[k]):
+            self._data[k] = _grow(self._data[k], n, n + len(frames))
+        self._data[k][n:n + len(frames)] = frames
+        self.n_frames[k] += len(frames)
+        self.c_totals[k] += calculate_c_total(frames)
+        self._stats.pop(k, None)
+
+    def _cluster_stats(self, k):
+        """Returns the medoid and outlier of cluster `k`, recalculated if it changed."""
+        if k not in self._stats:
+            comp_sims = calculate_comp_sim_array(self.cluster(k), n_ary=self.n_ary, weight=self.weight, 
+                                                 c_total=self.c_totals[k], memory_budget=self.memory_budget, 
+                                                 backend=self.backend)
+            self._stats[k] = _stats_from_comp_sims(self.c_totals[k], self.n_frames[k], comp_sims)
+        return self._stats[k]
+
+    def _column(self, method, k):
+        """Updates the similarity of each c0 frame with cluster `k` for `method` from 
+        the frames appended since the last update.
+
+        The pairwise sums add the pairs of old c0 frames with new ck frames and of 
+        new c0 frames with all ck frames. The union and medoid (outlier) columns 
+        are extended to the new c0 frames, or recalculated if the column sum 
+        (medoid, outlier) of the cluster changed.
+
+        Returns
+        -------
+        numpy.ndarray
+            The similarity of each c0 frame with cluster `k`.
+        """
+        c0, ck = self.cluster(0), self.cluster(k)
+        rows, state = self._done[method].get(k, (0, None))
+        column = self._cols[method].get(k, np.empty(0))
+        if len(column) < len(c0):
+            column = self._cols[method][k] = _grow(column, rows, len(c0))
+        kwargs = {'n_ary': self.n_ary, 'weight': self.weight, 'c_threshold': None, 
+                  'w_factor': "fraction", 'backend': self.backend}
+        if method == 'pairwise':
+            # Sums of the similarities, `state` is the number of ck frames already summed
+            state = state or 0
+            if rows and state < len(ck):
+                column[:rows] += calculate_pairwise_avg_sim(c0[:rows], ck[state:], memory_budget=self.memory_budget,
+                                                            **kwargs) * (len(ck) - state)
+            if rows < len(c0):
+                column[rows:len(c0)] = calculate_pairwise_avg_sim(c0[rows:], ck, memory_budget=self.memory_budget,
+                                                                  **kwargs) * len(ck)
+            self._done[method][k] = (len(c0), len(ck))
+            return column[:len(c0)] / len(ck)
+
+        new_state = len(ck) if method == 'union' else self._cluster_stats(k)[method]
+        if new_state != state:
+            rows = 0
+        if rows < len(c0) and method == 'union':
+            column[rows:len(c0)] = calculate_union_sim_array(c0[rows:], self.c_totals[k], len(ck), 
+                                                             memory_budget=self.memory_budget, **kwargs)
+        elif rows < len(c0):
+            column[rows:len(c0)] = BatchSimilarityIndex(c0[rows:] + ck[new_state], 2, **kwargs)()
+        self._done[method][k] = (len(c0), new_state)
+        return column[:len(c0)]
+
+    def _calculate(self, method):
+        """Returns the current similarities of `method`, formatted as `FrameSimilarity` does.
+
+        Returns
+        -------
+        numpy.ndarray
+            The similarity of each c0 frame (rows) to each cluster from c1, weighted by 
+            the fraction of frames of each cluster if `weighted_by_frames` is True, 
+            with the average similarity of the frame as the last column.
+        """
+        if self.n_clusters < 2:
+            raise ValueError("At least two clusters are needed, append frames to cluster 1")
+        sims = np.column_stack([self._column(method, k) for k in range(1, self.n_clusters)])
+        if self.weighted_by_frames:
+            n_frames = np.array(self.n_frames)
+            sims = sims * (n_frames / np.sum(n_frames))[1:]
+        return np.column_stack([sims, np.mean(sims, axis=1)])
+
+    def calculate_pairwise(self):
+        """Returns the average pairwise similarity of each c0 frame with each cluster, 
+        see `FrameSimilarity.calculate_pairwise`."""
+        return self._calculate('pairwise')
+
+    def calculate_union(self):
+        """Returns the union similarity of each c0 frame with each cluster, 
+        see `FrameSimilarity.calculate_union`."""
+        return self._calculate('union')
+
+    def calculate_medoid(self):
+        """Returns the similarity of each c0 frame with the medoid of each cluster, 
+        see `FrameSimilarity.calculate_medoid`."""
+        return self._calculate('medoid')
+
+    def calculate_outlier(self):
+        """Returns the similarity of each c0 frame with the outlier of each cluster, 
+        see `FrameSimilarity.calculate_outlier`."""
+        return self._calculate('outlier')
+
+    def calculate_rep_frames(self, methods=None):
+        """Returns the current representative frame of each method.
+
+        Parameters
+        ----------
+        methods : list, optional
+            The methods, from 'pairwise', 'union', 'medoid', 'outlier', 'medoid_c0' 
+            and 'medoid_all'. The default is None, every method but 'medoid_all', 
+            which compares all frames.
+
+        Returns
+        -------
+        dict
+            The representative frame of each method, frames of c0 but for 'medoid_all', 
+            which is a frame of all clusters stacked in order.
         """
-        nw_dict = self._perform_calculation(calculate_outlier)
-        if not self.weighted_by_frames:
-            return nw_dict
-        elif self.weighted_by_frames:
-            return weight_dict(file_path=None, summary_file=self.summary_file, dict=nw_dict, 
-                               n_clusters=self.n_clusters)
-
-def trim_outliers(total_data, trim_frac=0.1, n_ary='RR', weight='nw', removal='nan'):
+        if methods is None:
+            methods = list(self.methods) + ['medoid_c0']
+        rep_frames = {}
+        for method in methods:
+            if method == 'medoid_c0':
+                rep_frames[method] = self._cluster_stats(0)['medoid']
+            elif method == 'medoid_all':
+                data = np.concatenate([self.cluster(k) for k in range(self.n_clusters)])
+                rep_frames[method] = int(calculate_medoid(data, n_ary=self.n_ary, weight=self.weight, 
+                                                          c_total=sum(self.c_totals), 
+                                                          memory_budget=self.memory_budget, backend=self.backend))
+            elif method in self.methods:
+                rep_frames[method] = calculate_max_frame(self._calculate(method))
+            else:
+                raise ValueError(f"Invalid method {method}. Choose from 'pairwise', 'union', 'medoid', "
+                                 "'outlier', 'medoid_c0', 'medoid_all'")
+        return rep_frames
+
+def _grow(array, n, size):
+    """Returns `array` with room for at least `size` rows, doubling its capacity, 
+    with its first `n` rows kept."""
+    grown = np.empty((max(size, 2 * len(array)),) + array.shape[1:], dtype=array.dtype)
+    grown[:n] = array[:n]
+    return grown
+
+def _calculate_stats(ck, n_ary, weight, backend='numpy'):
+    """Calculates the column sum, complementary similarities, medoid and outlier of a cluster."""
+    c_total = calculate_c_total(ck)
+    comp_sims = calculate_comp_sim_array(ck, n_ary=n_ary, weight=weight, c_total=c_total, backend=backend)
+    return _stats_from_comp_sims(c_total, len(ck), comp_sims)
+
+def _stats_from_comp_sims(c_total, n_frames, comp_sims):
+    """Builds the statistics of a cluster from its complementary similarities, 
+    with the medoid and outlier of each index for a list of indices."""
+    if comp_sims.dtype.names is None:
+        medoid = int(np.nanargmin(comp_sims))
+        outlier = int(np.nanargmax(comp_sims))
+    else:
+        medoid = {name: int(np.nanargmin(comp_sims[name])) for name in comp_sims.dtype.names}
+        outlier = {name: int(np.nanargmax(comp_sims[name])) for name in comp_sims.dtype.names}
+    return {'c_total': c_total, 'n_frames': n_frames, 'comp_sims': comp_sims,
+            'medoid': medoid, 'outlier': outlier}
+
+def _cluster_sims(c0, ck, stats, methods, n_ary, weight, backend='numpy', memory_budget=None):
+    """Calculates the similarity of each c0 frame with cluster `ck` for `methods`.
+
+    Parameters
+    ----------
+    c0 : numpy.ndarray
+        The frames of the top cluster.
+    ck : numpy.ndarray
+        The frames of the compared cluster.
+    stats : dict
+        The statistics of `ck` from `_calculate_stats`, only needed for 
+        'union', 'medoid' and 'outlier'.
+    methods : list
+        The methods to calculate, from 'pairwise', 'union', 'medoid' and 'outlier'.
+    n_ary : {str, list}
+        The similarity metric to use for comparing clusters, or a list of metrics.
+    weight : str
+        The weighting scheme to use for comparing clusters.
+    backend : str, optional
+        The backend of the esim counters. The default is 'numpy'.
+    memory_budget : int, optional
+        Maximum number of bytes of temporaries per block of the pairwise and 
+        union methods. The default is None.
+
+    Returns
+    -------
+    dict
+        The similarity vector of each method, a structured array with one field 
+        per index for a list of indices.
+    """
+    sims = {}
+    for method in methods:
+        if method == 'pairwise':
+            sims[method] = calculate_pairwise_avg_sim(c0, ck, n_ary=n_ary, weight=weight, c_threshold=None, 
+                                                      w_factor="fraction", memory_budget=memory_budget,
+                                                      backend=backend)
+        elif method == 'union':
+            sims[method] = calculate_union_sim_array(c0, stats['c_total'], stats['n_frames'], n_ary=n_ary,
+                                                     weight=weight, c_threshold=None, w_factor="fraction",
+                                                     memory_budget=memory_budget, backend=backend)
+        elif method in ('medoid', 'outlier') and isinstance(n_ary, str):
+            sims[method] = _frame_sims(c0, ck[stats[method]], n_ary, weight, backend)
+        elif method in ('medoid', 'outlier'):
+            # Indices sharing the same medoid (outlier) frame are evaluated from the same counters
+            sims[method] = np.empty(len(c0), dtype=[(name, 'f8') for name in n_ary])
+            for frame in set(stats[method].values()):
+                names = [name for name in n_ary if stats[method][name] == frame]
+                frame_sims = _frame_sims(c0, ck[frame], names, weight, backend)
+                for name in names:
+                    sims[method][name] = frame_sims[name]
+        else:
+            raise ValueError(f"Invalid method {method}. Choose from 'pairwise', 'union', 'medoid', 'outlier'")
+    return sims
+
+def _frame_sims(c0, frame, n_ary, weight, backend='numpy'):
+    """Returns the similarity of each c0 frame with `frame`, from the popcounts of 
+    the packed words if c0 is bit-packed."""
+    if isinstance(c0, PackedFingerprints):
+        return PackedPairSimilarityIndex((c0, frame), 2, n_ary=n_ary, weight=weight, c_threshold=None, 
+                                         w_factor="fraction")()
+    return BatchSimilarityIndex(c0 + frame, 2, n_ary=n_ary, weight=weight, c_threshold=None, 
+                                w_factor="fraction", backend=backend)()
+
+def _cluster_task(task):
+    """Worker for `FrameSimilarity` with `n_jobs` > 1.
+
+    Attaches to c0 in shared memory, opens the cluster store and calculates 
+    the similarities of a block of c0 frames with one cluster.
+
+    Returns
+    -------
+    tuple
+        The statistics of the cluster (None if not needed) and the similarity vector of each method.
+    """
+    shm = shared_memory.SharedMemory(name=task['c0_name'])
+    try:
+        c0 = np.ndarray(task['c0_shape'], dtype=task['c0_dtype'], buffer=shm.buf)
+        start, stop = task['rows']
+        ck = np.asarray(ClusterStore.open(task['folder'])[task['k']])
+        if task['n_features']:
+            c0 = PackedFingerprints(c0, task['n_features'])
+            ck = pack_fingerprints(ck)
+        stats = task['stats']
+        if stats is None and set(task['methods']) - {'pairwise'}:
+            stats = _calculate_stats(ck, task['n_ary'], task['weight'], task['backend'])
+        sims = _cluster_sims(c0[start:stop], ck, stats, task['methods'], task['n_ary'], task['weight'],
+                             task['backend'], task['memory_budget'])
+        del c0
+    finally:
+        shm.close()
+    return stats, sims
+
+def trim_outliers(total_data, trim_frac=0.1, n_ary='RR', weight='nw', removal='nan', comp_sims=None):
     """Trims a desired percentage of outliers (most dissimilar) from the dataset 
     by calculating largest complement similarity.
 
@@ -219,29 +993,273 @@ def trim_outliers(total_data, trim_frac=0.1, n_ary='RR', weight='nw', removal='n
         The weight method. The default is 'nw'.
     removal : str, optional
         The method of removal. The default is 'nan'.
+    comp_sims : numpy.ndarray, optional
+        Precomputed complementary similarities of `total_data`. The default is None.
 
     Returns
     -------
     numpy.ndarray
         The trimmed dataset.
     """
-    n_fingerprints = len(total_data)
-    c_total = np.sum(total_data, axis = 0)
-    comp_sims = []
-    for i, pixel in enumerate(total_data):
-        c_total_i = c_total - total_data[i]
-        sim_index = SimilarityIndex(c_total_i, n_fingerprints - 1, n_ary=n_ary, weight=weight,
-                                    c_threshold=None, w_factor="fraction")()
-        comp_sims.append(sim_index)
-    comp_sims = np.array(comp_sims)
-    cutoff = int(np.floor(n_fingerprints * float(trim_frac)))
-    highest_indices = np.argpartition(-comp_sims, cutoff)[:cutoff]
+    if comp_sims is None:
+        comp_sims = calculate_comp_sim_array(total_data, n_ary=n_ary, weight=weight,
+                                             c_threshold=None, w_factor="fraction")
+    highest_indices = _trimmed_rows(comp_sims, trim_frac)
     if removal == 'nan':
         total_data[highest_indices] = np.nan
     elif removal == 'delete':
         total_data = np.delete(total_data, highest_indices, axis=0)
     return total_data
 
+def _ranked_sums(data, ranking, cutoffs, memory_budget=None):
+    """Returns the column sum of the first `cutoff` frames of `ranking` for each of 
+    the sorted `cutoffs`, keyed by cutoff. The frames are summed once, in blocks of 
+    at most `memory_budget` bytes, with a running sum between consecutive cutoffs."""
+    n_features = data.shape[1]
+    chunk_size = _get_chunk_size(n_features, memory_budget=memory_budget, n_temporaries=1)
+    running = np.zeros(n_features)
+    sums, start = {}, 0
+    for cutoff in cutoffs:
+        for i in range(start, cutoff, chunk_size):
+            block = data[ranking[i:min(i + chunk_size, cutoff)]]
+            if isinstance(block, PackedFingerprints):
+                block = block.unpack()
+            running += np.sum(block, axis=0, dtype=np.float64)
+        sums[cutoff] = running.copy()
+        start = max(start, cutoff)
+    return sums
+
+def _trim_ranking(comp_sims):
+    """Returns the rows sorted by decreasing complementary similarity, the first 
+    on ties, so the rows trimmed by increasing fractions are nested."""
+    return np.argsort(-comp_sims, kind='stable')
+
+def _trimmed_rows(comp_sims, trim_frac, ranking=None):
+    """Returns the rows with the `trim_frac` largest complementary similarities, 
+    the first rows of `ranking` if given."""
+    cutoff = int(np.floor(len(comp_sims) * float(trim_frac or 0)))
+    if ranking is None:
+        ranking = _trim_ranking(comp_sims)
+    return ranking[:cutoff]
+
+def _sims_columns(data):
+    """Returns the frame labels and the 2D similarity values of a result, with the 
+    keys of a legacy dictionary as labels."""
+    if isinstance(data, dict) and 'sims' in data and 'frames' in data:
+        return np.asarray(data['frames']), np.column_stack([data['sims'], data['average']])
+    if isinstance(data, dict):
+        values = np.array(list(data.values()), dtype=float)
+        return list(data), values.reshape(len(data), -1)
+    values = np.asarray(data, dtype=float)
+    return np.arange(len(values)), values.reshape(len(values), -1)
+
+def calculate_top_frames(data, k=10):
+    """Calculate the `k` c0 frames with the highest similarity values.
+
+    Each frame is scored by its maximum value over every cluster and the average, 
+    the score `calculate_max_key` ranks frames by. The frames are then sorted by 
+    decreasing score with a stable sort, so ties are broken by frame order.
+
+    Parameters
+    ----------
+    data : {dict, numpy.ndarray}
+        The columnar similarity values from `load_sims`, with the `frames`, 
+        `sims` and `average` arrays, the output array of a `FrameSimilarity` 
+        method, with the average as the last column, or a legacy similarity 
+        dictionary keyed by frame.
+    k : int, optional
+        The number of frames to return. The default is 10.
+
+    Returns
+    -------
+    frames : numpy.ndarray
+        The top `k` frames, best first. Fewer are returned if less than `k` 
+        frames have a value that is not NaN.
+    scores : numpy.ndarray
+        The score of each frame.
+    """
+    labels, values = _sims_columns(data)
+    scores = np.full(len(values), -np.inf)
+    valid = ~np.isnan(values).all(axis=1)
+    scores[valid] = np.nanmax(values[valid], axis=1)
+    k = min(k, int(valid.sum()))
+    if k < 1:
+        return np.array([], dtype=int), np.array([])
+    # Keep every frame tied with the k-th score so the stable sort below decides the ties
+    kth = np.partition(scores, len(scores) - k)[len(scores) - k]
+    candidates = np.flatnonzero(valid & (scores >= kth))
+    rows = candidates[np.argsort(-scores[candidates], kind='stable')[:k]]
+    if isinstance(labels, list):
+        frames = np.array([int(re.findall(r'\d+', labels[row])[0]) for row in rows], dtype=int)
+    else:
+        frames = labels[rows]
+    return frames, scores[rows]
+
+def calculate_max_key(dict):
+    """Calculate the key with the maximum value in a dictionary.
+
+    Parameters
+    ----------
+    dict : dict
+        The dictionary to be searched.
+    
+    Returns
+    -------
+    max_key : int
+        The key with the maximum value.
+    """
+    return int(calculate_top_frames(dict, k=1)[0][0])
+
+def calculate_max_frame(data):
+    """Calculate the c0 frame with the maximum value in columnar similarity values, 
+    the top frame of `calculate_top_frames`.
+
+    Parameters
+    ----------
+    data : {dict, numpy.ndarray}
+        The columnar similarity values from `load_sims`, with the `frames`, 
+        `sims` and `average` arrays, or the output array of a `FrameSimilarity` 
+        method, with the average as the last column.
+
+    Returns
+    -------
+    int
+        The frame with the maximum value over every cluster and the average, 
+        the first one in frame order on ties.
+    """
+    return int(calculate_top_frames(data, k=1)[0][0])
+
+def save_sims(file_path, sims, **metadata):
+    """Saves similarity values as a columnar `.npz` file instead of indented JSON.
+
+    Parameters
+    ----------
+    file_path : str
+        The path to the `.npz` file.
+    sims : {numpy.ndarray, dict}
+        The output of a `FrameSimilarity` method, with the similarity of each c0 
+        frame to every cluster and their average as the last column, or the 
+        legacy dictionary keyed by `f{i}`.
+    **metadata
+        Metadata saved with the values, e.g. `method`, `n_ary`, `weight`, 
+        `trim_frac` and `weighted_by_frames`. None values are not saved.
+    
+    Notes
+    -----
+    The file holds `frames`, the c0 frame numbers, `sims`, a frames x clusters 
+    array of the similarity to each cluster, and `average`, their average.
+    """
+    if isinstance(sims, dict):
+        frames = np.array([int(key[1:]) for key in sims], dtype=np.int64)
+        values = np.array(list(sims.values()), dtype=np.float64).reshape(len(frames), -1)
+    else:
+        values = np.asarray(sims, dtype=np.float64)
+        frames = np.arange(len(values))
+    np.savez(file_path, frames=frames, sims=values[:, :-1], average=values[:, -1],
+             **{key: value for key, value in metadata.items() if value is not None})
+
+def load_sims(file_path):
+    """Loads similarity values saved by `save_sims`.
+
+    Parameters
+    ----------
+    file_path : str
+        The path to the `.npz` file.
+
+    Returns
+    -------
+    dict
+        The `frames`, `sims` and `average` arrays and the metadata as Python scalars.
+    """
+    with np.load(file_path) as data:
+        return {key: data[key] if data[key].ndim else data[key].item() for key in data.files}
+
+def weight_sims(sims, summary_file, n_clusters=None):
+    """Weights the similarity to each cluster by its fraction of the frames.
+
+    Parameters
+    ----------
+    sims : numpy.ndarray
+        The similarity of each c0 frame (rows) to each cluster from c1 (columns).
+    summary_file : str
+        The path to the summary file containing the number of frames for each cluster.
+    n_clusters : int, optional
+        The number of clusters to analyze. The default is None, every cluster of the summary.
+
+    Returns
+    -------
+    numpy.ndarray
+        The weighted similarity values, one column per cluster from c1 up to `n_clusters`.
+    """
+    num = _read_populations(summary_file)
+    if n_clusters:
+        num = num[0:n_clusters]
+    weights = (num / np.sum(num, axis=0))[1:]
+    if len(weights) > sims.shape[1]:
+        raise ValueError(f"{len(weights) + 1} clusters in the summary but only {sims.shape[1] + 1} "
+                         "clusters compared, check n_clusters")
+    return sims[:, :len(weights)] * weights
+
+def _read_populations(summary_file):
+    """Returns the number of frames of each cluster from the summary file."""
+    return np.atleast_1d(np.loadtxt(summary_file, unpack=True, usecols=(1), skiprows=(1), delimiter=','))
+
+def sweep_n_clusters(sims, summary_file, n_clusters, weighted_by_frames=True):
+    """Calculates the average similarity and the representative frame for several 
+    numbers of clusters from one set of per-cluster similarities.
+
+    The weight of each cluster within the top `N` clusters is its number of frames 
+    over the frames of those `N` clusters, so the weighted average of every prefix 
+    is a cumulative sum over the clusters divided by the total of the prefix. The 
+    maximum weighted value of each frame is a cumulative maximum scaled the same 
+    way, so all numbers of clusters take a single pass over the columns.
+
+    Parameters
+    ----------
+    sims : numpy.ndarray
+        The unweighted similarity of each c0 frame (rows) to each cluster from c1 
+        (columns), e.g. `FrameSimilarity.sims`.
+    summary_file : str
+        The path to the summary file containing the number of frames for each cluster.
+    n_clusters : list
+        The numbers of clusters, counting c0, e.g. [5, 10, 15, 20].
+    weighted_by_frames : bool, optional
+        Whether to weight similarity values by the number of frames. The default is True.
+
+    Returns
+    -------
+    averages : numpy.ndarray
+        The average similarity of each c0 frame (rows) for each number of clusters 
+        (columns), the last column `FrameSimilarity` returns with that `n_clusters`. 
+        Without weighting, the average over the first `N - 1` clusters.
+    rep_frames : numpy.ndarray
+        The representative frame for each number of clusters, as `calculate_max_frame` 
+        selects it from the weighted similarities and their average.
+
+    Raises
+    ------
+    ValueError
+        If a number of clusters is below 2 or above the clusters compared or in the summary.
+    """
+    n_clusters = np.asarray(n_clusters, dtype=int)
+    num = _read_populations(summary_file)
+    max_clusters = min(sims.shape[1] + 1, len(num))
+    if n_clusters.min() < 2 or n_clusters.max() > max_clusters:
+        raise ValueError(f"Numbers of clusters must be between 2 and {max_clusters}")
+    columns = n_clusters - 2
+    if weighted_by_frames:
+        # Weights of the prefix of N clusters are num[1:N] / sum(num[:N])
+        scaled = sims * num[1:sims.shape[1] + 1]
+        totals = np.cumsum(num)[n_clusters - 1]
+    else:
+        scaled = sims
+        totals = np.ones(len(n_clusters))
+    averages = np.cumsum(scaled, axis=1)[:, columns] / (totals * (n_clusters - 1))
+    max_values = np.fmax.accumulate(scaled, axis=1)[:, columns] / totals
+    scores = np.fmax(max_values, averages)
+    rep_frames = np.array([np.nanargmax(scores[:, i]) for i in range(len(n_clusters))], dtype=int)
+    return averages, rep_frames
+
 def weight_dict(file_path=None, summary_file=None, dict=None, n_clusters=None):
     """Calculates frame-weighted similarity values by the number of frames in each cluster.
 
@@ -264,48 +1282,25 @@ def weight_dict(file_path=None, summary_file=None, dict=None, n_clusters=None):
     if file_path:
         with open(file_path, 'r') as file:
             dict = json.load(file)
-    elif dict:
-        dict = dict
-    for key in dict:
-        dict[key].pop()
-    
-    num = np.loadtxt(summary_file, unpack=True, usecols=(1), skiprows=(1), delimiter=',')
-    if n_clusters:
-        num = num[0:n_clusters]
-    w_sum = np.sum(num, axis=0)
-    weights = num / w_sum
-    weights = weights[1:]
-
-    w_dict = {}
-    for key in dict:
-        old_list = dict[key]
-        w_dict[key] = [old_list[i] * v for i, v in enumerate(weights)]
-    for k in w_dict:
-        average = sum(w_dict[k]) / len(w_dict[k])
-        w_dict[k].append(average)
+    # The last value of each frame is the unweighted average
+    values = np.array(list(dict.values()), dtype=np.float64)[:, :-1]
+    w_sims = weight_sims(values, summary_file, n_clusters=n_clusters)
+    w_sims = np.column_stack([w_sims, np.mean(w_sims, axis=1)])
+    return {key: row.tolist() for key, row in zip(dict, w_sims)}
 
-    return w_dict
-
-def _format_dict(dict):
-    """Sorts dict to have frame # as the key and attaches the average value to the end of each key.
+def sims_to_dict(sims):
+    """Converts the output array of a `FrameSimilarity` method to the legacy dictionary.
 
     Parameters
     ----------
-    dict : dict
-        A dictionary containing the similarity values.
-    
+    sims : numpy.ndarray
+        The similarity of each c0 frame (rows) to each cluster, with the average 
+        as the last column.
+
     Returns
     -------
     dict
-        A dictionary with the frame number as the key and the average value attached to the end.
+        A dictionary with the frame number `f{i}` as the key and the similarity to 
+        each cluster, with the average attached to the end, as the value.
     """
-    nw_dict = {}
-    for i in sorted(dict):
-        for k, v in dict[i].items():
-            if k not in nw_dict:
-                nw_dict[k] = [None] * len(dict)
-            nw_dict[k][i] = v
-    for k in nw_dict:
-        average = sum(nw_dict[k]) / len(nw_dict[k])
-        nw_dict[k].append(average)
-    return nw_dict
\ No newline at end of file
+    return {f"f{i}": row.tolist() for i, row in enumerate(np.asarray(sims))}
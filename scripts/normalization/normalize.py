@@ -1,15 +1,15 @@
 """
 Potential Error:
-File "<__array_function__ internals>", line 180, in concatenate
-ValueError: need at least one array to concatenate
+ValueError: No clusters to pack
 Path Incorrect"""
 
-import numpy as np
 import sys
 sys.path.insert(0, '../../')
-from modules.inputs.preprocess import gen_traj_numpy, normalize_file, Normalizer
+from modules.inputs.preprocess import normalize_clusters
+from modules.cluster_store import ClusterStore
 import re
 import glob
+import numpy as np
 
 # System info - EDIT THESE
 input_top = '../../example/aligned_tau.pdb'
@@ -17,20 +17,13 @@ unnormed_cluster_dir = '../clusters/outputs/clusttraj_*'
 output_base_name = 'normed_clusttraj'
 atomSelection = 'resid 3 to 12 and name N CA C O H'
 n_clusters = 10
+n_jobs = 1
 
 if __name__ == '__main__':
     list_clusttraj = sorted(glob.glob(unnormed_cluster_dir), 
                             key=lambda x: int(re.findall("\d+", x)[0]))
     list_clusttraj = list_clusttraj[:n_clusters]
-    all_clusttraj = []
-    for clusttraj in list_clusttraj:
-        traj_numpy = gen_traj_numpy(input_top, clusttraj, atomSelection)
-        all_clusttraj.append(traj_numpy)
-    concat_clusttraj = np.concatenate(all_clusttraj)
-    normed_data, min, max, avg = normalize_file(concat_clusttraj, norm_type='v3')
-    np.save('normed_data.npy', normed_data)
-    for i, traj in enumerate(all_clusttraj):
-        norm = Normalizer(data=traj, custom_min=min, custom_max=max)
-        normed_frame = norm.get_v3_norm()
-        np.save(f'{output_base_name}.c{i}.npy', normed_frame)
-    
\ No newline at end of file
+    normed_files = normalize_clusters(list_clusttraj, output_base_name=output_base_name,
+                                      prmtopFileName=input_top, atomSel=atomSelection, n_jobs=n_jobs,
+                                      dtype=np.float32)
+    ClusterStore.save('.', normed_files)
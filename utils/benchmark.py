@@ -0,0 +1,187 @@
+"""Benchmark esim, FrameSimilarity and read_cpptraj on synthetic normalized trajectories.
+Reports the time, peak memory and the empirical scaling exponent with the number of frames.
+
+Example usage:
+>>> python benchmark.py
+>>> python benchmark.py -f 2000 4000 8000 -k 150 -c 10 -b medoid union
+>>> python benchmark.py -f 1000 2000 4000 -o bench.csv
+"""
+import sys
+sys.path.insert(0, '../../')
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import modules as mod
+
+BENCHMARKS = ['counters', 'medoid', 'comp_sim', 'trim_outliers',
+              'pairwise', 'union', 'frame_medoid', 'frame_outlier', 'read_cpptraj']
+
+def gen_synthetic_clusters(n_frames, n_features, n_clusters, seed=0):
+    """Generates normalized clusters in [0, 1], sorted from largest to smallest.
+
+    Parameters
+    ----------
+    n_frames : int
+        The total number of frames.
+    n_features : int
+        The number of features per frame.
+    n_clusters : int
+        The number of clusters.
+    seed : int, optional
+        The random seed. The default is 0.
+
+    Returns
+    -------
+    list
+        The frames of each cluster.
+    """
+    rng = np.random.default_rng(seed)
+    sizes = np.sort(rng.dirichlet(np.full(n_clusters, 5.)))[::-1] * n_frames
+    sizes = np.maximum(2, np.round(sizes).astype(int))
+    centers = rng.random((n_clusters, n_features))
+    return [np.clip(center + 0.1 * rng.standard_normal((size, n_features)), 0, 1)
+            for center, size in zip(centers, sizes)]
+
+def write_synthetic_folder(folder, clusters):
+    """Writes the clusters as `normed_clusttraj.c*.npy` files and a summary file.
+
+    Returns
+    -------
+    str
+        The path to the summary file.
+    """
+    for i, cluster in enumerate(clusters):
+        np.save(f"{folder}/normed_clusttraj.c{i}.npy", cluster)
+    summary_file = f"{folder}/summary.csv"
+    with open(summary_file, 'w') as f:
+        f.write('# Cluster Index, Number of frames\n')
+        for i, cluster in enumerate(clusters):
+            f.write(f'{i},{len(cluster)}\n')
+    return summary_file
+
+def write_synthetic_crd(folder, clusters):
+    """Writes the clusters (scaled to coordinates) as cpptraj `clusttraj.c*` CRD files.
+
+    Returns
+    -------
+    int
+        The number of lines per frame, the `break_line` of `read_cpptraj`.
+    """
+    for i, cluster in enumerate(clusters):
+        with open(f"{folder}/clusttraj.c{i}", 'w') as f:
+            f.write('Cpptraj Generated trajectory\n')
+            for frame in 100 * cluster - 50:
+                fields = [f'{value:8.3f}' for value in frame]
+                for j in range(0, len(fields), 10):
+                    f.write(''.join(fields[j:j + 10]) + '\n')
+    return -(-clusters[0].shape[1] // 10)
+
+def measure(func, repeats=3):
+    """Measures the best time of `repeats` calls and the peak memory of one traced call.
+
+    Returns
+    -------
+    tuple
+        The time in seconds and the peak memory in bytes.
+    """
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(times), peak
+
+def scaling_exponent(sizes, times):
+    """Fits time ~ size**exponent and returns the exponent, NaN with less than two sizes."""
+    if len(sizes) < 2:
+        return float('nan')
+    return np.polyfit(np.log(sizes), np.log(times), 1)[0]
+
+def run_benchmarks(frames, n_features, n_clusters, benchmarks, repeats=3, n_ary='RR', seed=0):
+    """Runs the benchmarks for every total number of frames in `frames`.
+
+    Returns
+    -------
+    list
+        One dict per benchmark and number of frames with the time, peak memory and scaling exponent.
+    """
+    results = []
+    for n_frames in frames:
+        clusters = gen_synthetic_clusters(n_frames, n_features, n_clusters, seed=seed)
+        c0 = clusters[0]
+        data = np.concatenate(clusters)
+        with tempfile.TemporaryDirectory() as folder:
+            summary_file = write_synthetic_folder(folder, clusters)
+
+            def frame_sim(method):
+                return lambda: getattr(mod.FrameSimilarity(cluster_folder=folder, summary_file=summary_file,
+                                                           n_ary=n_ary), f'calculate_{method}')()
+            cases = {'counters': lambda: mod.calculate_counters(np.sum(data, axis=0), len(data)),
+                     'medoid': lambda: mod.calculate_medoid(data, n_ary=n_ary),
+                     'comp_sim': lambda: mod.calculate_comp_sim(data, n_ary=n_ary),
+                     'trim_outliers': lambda: mod.trim_outliers(c0.copy(), trim_frac=0.1, n_ary=n_ary),
+                     'pairwise': frame_sim('pairwise'),
+                     'union': frame_sim('union'),
+                     'frame_medoid': frame_sim('medoid'),
+                     'frame_outlier': frame_sim('outlier')}
+            if 'read_cpptraj' in benchmarks:
+                break_line = write_synthetic_crd(folder, clusters)
+
+                def read():
+                    cwd = os.getcwd()
+                    os.chdir(folder)
+                    try:
+                        mod.read_cpptraj(break_line=break_line)
+                    finally:
+                        os.chdir(cwd)
+                cases['read_cpptraj'] = read
+
+            for name in benchmarks:
+                elapsed, peak = measure(cases[name], repeats=repeats)
+                results.append({'benchmark': name, 'n_frames': len(data), 'n_features': n_features,
+                                'n_clusters': n_clusters, 'time': elapsed, 'peak_memory': peak})
+                print(f"{name:>14} {len(data):>9} frames: {elapsed:10.4f} s {peak / 2**20:10.2f} MB", flush=True)
+
+    for name in benchmarks:
+        rows = [row for row in results if row['benchmark'] == name]
+        exponent = scaling_exponent([row['n_frames'] for row in rows], [row['time'] for row in rows])
+        for row in rows:
+            row['scaling_exponent'] = exponent
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark esim and FrameSimilarity scaling')
+    parser.add_argument('-f', '--frames', type=int, nargs='+', default=[1000, 2000, 4000],
+                        help='Total numbers of frames to benchmark (default: 1000 2000 4000)')
+    parser.add_argument('-k', '--n_features', type=int, default=150,
+                        help='Number of features per frame (default: 150)')
+    parser.add_argument('-c', '--n_clusters', type=int, default=10,
+                        help='Number of clusters (default: 10)')
+    parser.add_argument('-b', '--benchmarks', nargs='+', default=BENCHMARKS, choices=BENCHMARKS,
+                        help='Benchmarks to run (default: all)')
+    parser.add_argument('-i', '--index', default='RR', help='Similarity Index to use (default: RR)')
+    parser.add_argument('-r', '--repeats', type=int, default=3, help='Timed repeats (default: 3)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+    parser.add_argument('-o', '--output', help='CSV file to write the results to')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.frames, args.n_features, args.n_clusters, args.benchmarks,
+                             repeats=args.repeats, n_ary=args.index, seed=args.seed)
+    print("\nScaling exponent with the number of frames (1 is linear):")
+    for name in args.benchmarks:
+        exponent = next(row['scaling_exponent'] for row in results if row['benchmark'] == name)
+        print(f"{name:>14}: {exponent:.2f}")
+
+    if args.output:
+        keys = list(results[0])
+        with open(args.output, 'w') as f:
+            f.write(','.join(keys) + '\n')
+            for row in results:
+                f.write(','.join(str(row[key]) for key in keys) + '\n')
@@ -9,6 +9,12 @@ No trim, RR index
 >>> python scripts/rep_frames.py -t 0.1
 20% trim, SM index
 >>> python scripts/rep_frames.py -t 0.2 -i SM
+10% trim, RR, SM and JT indices in one run
+>>> python scripts/rep_frames.py -t 0.1 -i RR SM JT
+Top 10 frames of the union method, 10% trim, SM index
+>>> python scripts/rep_frames.py -m union -t 0.1 -i SM -k 10
+Medoid of every 500-frame window of a normalized trajectory, every 100 frames
+>>> python scripts/rep_frames.py -f normed_traj.npy -W 500 --step 100 -i SM
 """
 import sys
 sys.path.insert(0, '../../')
@@ -20,14 +26,29 @@ parser.add_argument('-m', '--method', type=str, help='method to use')
 parser.add_argument('-s', '--sim_folder', type=str, help='folder to access')
 parser.add_argument('-t', '--trim_frac', type=float, default=None,
                     help='Trim parameter for gen_method_max method')
-parser.add_argument('-i', '--index', type=str, default='RR',
-                    help='n_ary parameter for gen_method_max method')
+parser.add_argument('-i', '--index', type=str, nargs='+', default=['RR'],
+                    help='n_ary parameter for gen_method_max method, several indices run together')
 parser.add_argument('-d', '--norm_folder', type=str, help='norm_folder to access')
+parser.add_argument('-b', '--memory_budget', type=float, default=None,
+                    help='Memory budget in MB per block for the medoid calculations')
+parser.add_argument('-k', '--top_k', type=int, default=1,
+                    help='Number of top frames and scores to write for a single method (default: 1)')
+parser.add_argument('-f', '--traj_file', type=str, help='Normalized trajectory .npy file for the window mode')
+parser.add_argument('-W', '--window', type=int, default=None,
+                    help='Width of the windows, writes the representative frame of each window of the trajectory')
+parser.add_argument('--step', type=int, default=None,
+                    help='Frames between the starts of consecutive windows (default: the window width)')
 
 args = parser.parse_args()
-if args.method:
+memory_budget = args.memory_budget * 2**20 if args.memory_budget else None
+n_ary = args.index[0] if len(args.index) == 1 else args.index
+if args.window:
+    mod.gen_window_rep_frames(args.traj_file, args.window, step=args.step, method=args.method or 'medoid', 
+                              sim_folder=args.sim_folder, n_ary=n_ary, memory_budget=memory_budget)
+elif args.method:
     mod.gen_one_method_max(method=args.method, sim_folder=args.sim_folder, norm_folder=args.norm_folder, 
-                           trim_frac=args.trim_frac, n_ary=args.index)
+                           trim_frac=args.trim_frac, n_ary=n_ary, memory_budget=memory_budget, 
+                           top_k=args.top_k)
 else:
     mod.gen_all_methods_max(sim_folder=args.sim_folder, norm_folder=args.norm_folder, 
-                            trim_frac=args.trim_frac, n_ary=args.index)
\ No newline at end of file
+                            trim_frac=args.trim_frac, n_ary=n_ary, memory_budget=memory_budget)
\ No newline at end of file
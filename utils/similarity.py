@@ -1,11 +1,16 @@
 """A script to calculate the similarity between clusters using different methods.
 Example usage:
 >>> python similarity.py -m medoid -n 11 -i RR
+>>> python similarity.py -m all -n 11 -i RR
+>>> python similarity.py -m all -n 11 -i RR SM JT
+>>> python similarity.py -m all -n 11 -i RR --trim_sweep 0 0.05 0.1 0.2
+>>> python similarity.py -m union -n 20 -i RR --cluster_sweep 5 10 15 20
 """
 import sys
 sys.path.insert(0, '../../')
 import argparse
 import modules as mod
+import numpy as np
 import json
 import time
 import os
@@ -13,49 +18,123 @@ import os
 # Parse command-line arguments
 parser = argparse.ArgumentParser()
 parser.add_argument('-m', '--method', help='Method to use for similarity calculation. \
-                    (pairwise, union, medoid, outlier)', required=True)
-parser.add_argument('-n', '--n_clusters', type=int, help='Number of clusters for analysis', 
-                    required=True)
-parser.add_argument('-i', '--index', help='Similarity Index to use (e.g. RR or SM)', 
+                    (pairwise, union, medoid, outlier, all)', required=True)
+parser.add_argument('-n', '--n_clusters', type=int, help='Number of clusters for analysis',
                     required=True)
+parser.add_argument('-i', '--index', nargs='+', help='Similarity Index to use (e.g. RR or SM). \
+                    Several indices are calculated together in a single run', required=True)
 parser.add_argument('-t', '--trim_frac', type=float, help='Fraction of outliers to trim. \
                     (e.g. 0.1, default: None)', default=None)
 parser.add_argument('-w', '--weighted_by_frames', help='Weighing clusters by frames it contains. \
                     (default: True)', default=True)
 parser.add_argument('-d', '--cluster_folder', help='Location of the cluster files directory',
                     required=True)
-parser.add_argument('-s', '--summary_file', help='Location of CPPTRAJ cluster summary file', 
+parser.add_argument('-s', '--summary_file', help='Location of CPPTRAJ cluster summary file',
                     required=True)
-args = parser.parse_args()
-
-# Calculate similarities
-start = time.perf_counter()
-lib = mod.FrameSimilarity(cluster_folder=args.cluster_folder, summary_file=args.summary_file, 
-                               n_clusters=args.n_clusters, trim_frac=args.trim_frac, 
-                               n_ary=args.index, weighted_by_frames=args.weighted_by_frames)
-method_func = getattr(lib, f'calculate_{args.method}')
-new_sims = method_func()
-
-if args.weighted_by_frames:
-    w = "w"
-
-else:
-    w = "nw"
-
-dir_name = 'outputs'
-if not os.path.exists(dir_name):
-    os.makedirs(dir_name)
-
-if args.trim_frac:
-    with open(f'{dir_name}/{w}_{args.method}_{args.index}_t{int(float(args.trim_frac) * 100)}.txt', 
-              'w') as file:
-        file.write(json.dumps(new_sims, indent=4))
-    end = time.perf_counter()
-    print(f"{w}_{args.method}_{args.index}_t{int(float(args.trim_frac) * 100)}: \
-          Finished in {round(end-start,2)} second")
+parser.add_argument('-j', '--n_jobs', type=int, help='Number of worker processes, -1 for all CPUs. \
+                    (default: 1)', default=1)
+parser.add_argument('-o', '--output_format', choices=['npz', 'txt'], help='Format of the similarity \
+                    files, columnar npz or JSON txt. (default: npz)', default='npz')
+parser.add_argument('-c', '--cache_dir', help='Directory of a persistent cache of the cluster statistics. \
+                    (default: None)', default=None)
+parser.add_argument('--trim_sweep', type=float, nargs='+', help='Several fractions of outliers to trim, \
+                    calculated together from a single ranking of c0. (e.g. 0 0.05 0.1, default: None)', default=None)
+parser.add_argument('--cluster_sweep', type=int, nargs='+', help='Several numbers of clusters, the average \
+                    similarities and representative frames of each are derived from one run. (e.g. 5 10 15 20, \
+                    default: None)', default=None)
+parser.add_argument('-p', '--packed', action='store_true', help='Bit-pack the frames, for clusters of binary \
+                    objects such as thresholded contact maps. (default: False)')
+parser.add_argument('-b', '--memory_budget', type=float, help='Memory budget in MB per block of the pairwise \
+                    and union methods. (default: None)', default=None)
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+
+    # Calculate similarities
+    start = time.perf_counter()
+    n_ary = args.index[0] if len(args.index) == 1 else args.index
+    if args.trim_sweep and args.trim_frac:
+        parser.error("--trim_sweep replaces -t, use only one of them")
+    if args.trim_sweep and args.cluster_sweep:
+        parser.error("--trim_sweep and --cluster_sweep cannot be combined")
+    lib = mod.FrameSimilarity(cluster_folder=args.cluster_folder, summary_file=args.summary_file,
+                              n_clusters=args.n_clusters, trim_frac=args.trim_frac,
+                              n_ary=n_ary, weighted_by_frames=args.weighted_by_frames,
+                              n_jobs=args.n_jobs, cache_dir=args.cache_dir,
+                              memory_budget=args.memory_budget * 2**20 if args.memory_budget else None,
+                              packed=args.packed)
+    methods = ['pairwise', 'union', 'medoid', 'outlier'] if args.method == 'all' else [args.method]
+    # Results and representative frames keyed by trim fraction, a single one without --trim_sweep
+    if args.cluster_sweep:
+        averages, sweep_frames = lib.calculate_cluster_sweep(args.cluster_sweep, methods=methods)
+        runs, run_frames = {}, None
+    elif args.trim_sweep:
+        runs, run_frames = lib.calculate_trim_sweep(args.trim_sweep, methods=methods)
+    elif args.method == 'all':
+        all_sims, rep_frames = lib.calculate_all()
+        runs, run_frames = {args.trim_frac: all_sims}, {args.trim_frac: rep_frames}
+    else:
+        method_func = getattr(lib, f'calculate_{args.method}')
+        runs, run_frames = {args.trim_frac: {args.method: method_func()}}, None
+
+    if args.weighted_by_frames:
+        w = "w"
+    else:
+        w = "nw"
+
+    dir_name = 'outputs'
+    if not os.path.exists(dir_name):
+        os.makedirs(dir_name)
+
+    for trim_frac, all_sims in runs.items():
+        rep_frames = run_frames[trim_frac] if run_frames else None
+        # Key the results of a single index by index, as for a list of indices
+        if isinstance(n_ary, str):
+            all_sims = {method: {n_ary: new_sims} for method, new_sims in all_sims.items()}
+            rep_frames = {n_ary: rep_frames}
+
+        if trim_frac:
+            t = f"_t{int(float(trim_frac) * 100)}"
+        else:
+            t = ""
+
+        for method, index_sims in all_sims.items():
+            for index, new_sims in index_sims.items():
+                if args.output_format == 'npz':
+                    mod.save_sims(f'{dir_name}/{w}_{method}_{index}{t}.npz', new_sims, method=method, 
+                                  n_ary=index, weight=lib.weight, trim_frac=trim_frac,
+                                  weighted_by_frames=(w == "w"), n_clusters=args.n_clusters)
+                else:
+                    with open(f'{dir_name}/{w}_{method}_{index}{t}.txt', 'w') as file:
+                        file.write(json.dumps(mod.sims_to_dict(new_sims), indent=4))
+
+        if args.method == 'all':
+            for index, index_frames in rep_frames.items():
+                with open(f'{dir_name}/{w}_rep_{index}{t}.txt', 'w') as file:
+                    file.write(f"# Frame number with max values by method: {', '.join(index_frames)}\n")
+                    file.write(", ".join(str(frame) for frame in index_frames.values()))
+
+    if args.trim_sweep:
+        t = "_t" + "_".join(str(int(float(frac) * 100)) for frac in args.trim_sweep)
+    elif args.trim_frac:
+        t = f"_t{int(float(args.trim_frac) * 100)}"
+    else:
+        t = ""
 
-else:
-    with open(f'{dir_name}/{w}_{args.method}_{args.index}.txt', 'w') as file:
-        file.write(json.dumps(new_sims, indent=4))
+    if args.cluster_sweep:
+        # Key the results of a single index by index, as for a list of indices
+        if isinstance(n_ary, str):
+            averages = {method: {n_ary: values} for method, values in averages.items()}
+            sweep_frames = {method: {n_ary: frames} for method, frames in sweep_frames.items()}
+        for method, index_averages in averages.items():
+            for index, values in index_averages.items():
+                np.savez(f'{dir_name}/{w}_{method}_{index}{t}_nclusters.npz', n_clusters=args.cluster_sweep, 
+                         average=values, rep_frames=list(sweep_frames[method][index].values()))
+        for index in args.index:
+            with open(f'{dir_name}/{w}_rep_{index}{t}_nclusters.txt', 'w') as file:
+                file.write(f"# Frame number with max values by number of clusters and method: {', '.join(methods)}\n")
+                for n_clusters in args.cluster_sweep:
+                    frames = [str(sweep_frames[method][index][n_clusters]) for method in methods]
+                    file.write(f"{n_clusters}: {', '.join(frames)}\n")
     end = time.perf_counter()
-    print(f"{w}_{args.method}_{args.index}: Finished in {round(end-start,2)} second")
\ No newline at end of file
+    print(f"{w}_{args.method}_{'_'.join(args.index)}{t}: Finished in {round(end-start,2)} second")